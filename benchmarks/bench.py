@@ -0,0 +1,209 @@
+"""
+基准测试: 解析、数据库查询、加载/保存与爬取吞吐量
+
+用法:
+    python benchmarks/bench.py --sizes 1000 25000 100000 --output benchmarks/results/latest.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json          # 与基线比较, 退化时退出码为 1
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json     # 保存为新的基线
+"""
+import argparse
+import asyncio
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable
+
+import ujson
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import make_database, make_query_form  # noqa: E402
+from importtime import SCENARIOS, measure_import  # noqa: E402
+from phonedb_api import (  # noqa: E402
+    AsyncParallelRunner,
+    InstCat,
+    InstMeta,
+    JsonDatabase,
+    MemoryDatabase,
+    PhoneDBHTTPSession,
+    PickleDatabase,
+    Query,
+    QueryStrategy,
+    SyntheticStore,
+    render_detail_page,
+)
+from phonedb_api.fake_server import FakePhoneDBServer  # noqa: E402
+from phonedb_api.parse import InstanceParser, QueryFormParser  # noqa: E402
+
+QUERY_CASES: dict[QueryStrategy, dict] = {
+    QueryStrategy.CONTAINS: {"Application processor, Chipset": {"CPU": [Query("Snapdragon 865")]}},
+    QueryStrategy.EQUALS: {"Display": {"Display Type": [Query("Color AM-OLED display", QueryStrategy.EQUALS)]}},
+    QueryStrategy.AT_LEAST: {"Application processor, Chipset": {"CPU Core(s)": [Query("8", QueryStrategy.AT_LEAST)]}},
+    QueryStrategy.WITHOUT_UNIT_AT_LEAST: {"Operative Memory": {"RAM Capacity": [Query("8192", QueryStrategy.WITHOUT_UNIT_AT_LEAST)]}},
+    QueryStrategy.DISPLAY_RESOLUTION_AT_LEAST: {"Display": {"Resolution": [Query("1440x2560", QueryStrategy.DISPLAY_RESOLUTION_AT_LEAST)]}},
+}
+
+
+def measure(func: Callable[[], Any], repeat: int = 3, number: int = 1) -> float:
+    """
+    :return: 多次运行中最快一次的单次耗时 (秒)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def measure_async(func: Callable[[], Awaitable[Any]], repeat: int = 3) -> float:
+    async def run() -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    return asyncio.run(run())
+
+
+def result(seconds: float, items: int = 1) -> dict[str, float]:
+    return {"seconds": seconds, "items": items, "items_per_sec": items / seconds if seconds else 0.0}
+
+
+def bench_parsers(database: MemoryDatabase) -> dict[str, dict]:
+    instances = list(database.get_all_data()[InstCat.DEVICE].items())[:200]
+    pages = [(InstMeta(InstCat.DEVICE, int(inst_id)), render_detail_page(data)) for inst_id, data in instances]
+
+    def parse_pages():
+        for inst_meta, page in pages:
+            asyncio.run(InstanceParser(inst_meta, page).parse())
+
+    form = make_query_form()
+    return {
+        "parse.instance_page": result(measure(parse_pages), len(pages)),
+        "parse.query_form": result(measure(lambda: asyncio.run(QueryFormParser(form).parse({"Select Field 1": "Option 1-2"}))), 1),
+    }
+
+
+def bench_queries(size: int, database: MemoryDatabase) -> dict[str, dict]:
+    results = {
+        f"database.search_data.{size}": result(measure(lambda: database.search_data(InstCat.DEVICE, "snapdragon 865")), size)
+    }
+    for strategy, params in QUERY_CASES.items():
+        results[f"database.query_data.{strategy}.{size}"] = result(
+            measure(lambda: database.query_data(InstCat.DEVICE, params)), size
+        )
+    return results
+
+
+def bench_load_dump(size: int, database: MemoryDatabase) -> dict[str, dict]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, cls in (("json", JsonDatabase), ("pickle", PickleDatabase)):
+            target = cls(os.path.join(directory, f"bench.{name}"))
+            target._data = database.get_all_data()
+
+            async def load():
+                await cls(target.filepath).load()
+
+            results[f"database.{name}.dump.{size}"] = result(measure_async(target.dump, repeat=1), size)
+            results[f"database.{name}.load.{size}"] = result(measure_async(load, repeat=1), size)
+    return results
+
+
+def bench_crawl(database: MemoryDatabase, pages: int, max_workers: int) -> dict[str, dict]:
+    inst_metas = [InstMeta(InstCat.DEVICE, inst_id) for inst_id in range(1, pages + 1)]
+
+    async def crawl() -> float:
+        async with FakePhoneDBServer(SyntheticStore(database)) as server:
+            session = PhoneDBHTTPSession(AsyncParallelRunner(max_workers), MemoryDatabase(), base_url=server.base_url)
+            start = time.perf_counter()
+            async for _ in session.get_data_multi(inst_metas):
+                pass
+            elapsed = time.perf_counter() - start
+            await session.transport.close()
+            return elapsed
+
+    return {f"crawl.get_data_multi.{pages}": result(asyncio.run(crawl()), pages)}
+
+
+def bench_imports() -> dict[str, dict]:
+    return {f"import.{scenario}": result(measure_import(statement)[0]) for scenario, statement in SCENARIOS.items()}
+
+
+def compare(current: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """
+    :return: 耗时超过基线 threshold 倍的项目
+    """
+    regressions = []
+    for name, entry in sorted(current.items()):
+        if name not in baseline:
+            continue
+        ratio = entry["seconds"] / baseline[name]["seconds"] if baseline[name]["seconds"] else 1.0
+        flag = "REGRESSION" if ratio > threshold else "ok"
+        print(f"{name:60s} {entry['seconds'] * 1000:10.2f} ms  x{ratio:5.2f}  {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 25000, 100000])
+    parser.add_argument("--crawl-pages", type=int, default=2000)
+    parser.add_argument("--crawl-workers", type=int, default=64)
+    parser.add_argument("--skip-crawl", action="store_true")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "results", "latest.json"))
+    parser.add_argument("--baseline", help="与该基线文件比较")
+    parser.add_argument("--save-baseline", help="将结果保存为基线文件")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时超过基线该倍数视为退化")
+    args = parser.parse_args()
+    # 占位记录会产生大量 "无内容" 警告, 只保留错误日志
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    results: dict[str, dict] = bench_imports()
+    for size in args.sizes:
+        database = make_database(size)
+        if size == args.sizes[0]:
+            results |= bench_parsers(database)
+        results |= bench_queries(size, database)
+        results |= bench_load_dump(size, database)
+        print(f"size {size} done", file=sys.stderr)
+    if not args.skip_crawl:
+        results |= bench_crawl(make_database(args.crawl_pages), args.crawl_pages, args.crawl_workers)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(ujson.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = ujson.loads(f.read())["results"]
+        if regressions := compare(results, baseline, args.threshold):
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    else:
+        for name, entry in sorted(results.items()):
+            print(f"{name:60s} {entry['seconds'] * 1000:10.2f} ms  {entry['items_per_sec']:12.1f} items/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
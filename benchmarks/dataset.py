@@ -0,0 +1,145 @@
+"""
+合成数据集, 结构与 MemoryDatabase._data 中的真实数据一致
+"""
+import random
+
+from phonedb_api import InstCat, InstMeta, MemoryDatabase
+
+_BRANDS = ["Samsung", "Xiaomi", "Apple", "Google", "OnePlus", "Oppo", "Vivo", "Huawei", "Honor", "Sony", "Motorola", "Realme"]
+_CHIPSETS = [
+    "Qualcomm Snapdragon 8 Gen 3 SM8650-AB",
+    "Qualcomm Snapdragon 865 5G SM8250",
+    "Qualcomm Snapdragon 865+ 5G SM8250-AB",
+    "MediaTek Dimensity 9300 MT6989",
+    "Samsung Exynos 2400 S5E9945",
+    "Apple A17 Pro APL1V02",
+    "HiSilicon Kirin 9000S",
+]
+_RESOLUTIONS = ["720x1600", "1080x2340", "1080x2400", "1440x3120", "1440x3200", "1284x2778", "1600x720"]
+_DISPLAY_TYPES = ["Color AM-OLED display", "Color IPS TFT LCD display", "Color LTPO AM-OLED display"]
+_OS = ["Google Android 14 (Upside Down Cake)", "Google Android 13 (Tiramisu)", "Apple iOS 17", "Google Android 12 (Snow Cone)"]
+_COUNTRIES = ["China", "USA", "Germany", "India", "Japan", "France", "UK", "Brazil", "Korea", "Italy"]
+
+
+def make_instance(rng: random.Random, inst_id: int) -> dict:
+    brand = rng.choice(_BRANDS)
+    year = rng.randint(2010, 2025)
+    return {
+        "Meta": {"Image": f"https://phonedb.net/img/{inst_id}.jpg"},
+        "Introduction": {
+            "Brand": [brand],
+            "Model": [f"{brand} Model {inst_id}"],
+            "Released": [f"{year} {rng.choice(['Jan', 'Mar', 'Jun', 'Sep', 'Nov'])}"],
+            "Announced": [f"{year} Jan"],
+            "Hardware Designer": [brand],
+            "Manufacturer": [rng.choice(["Foxconn", "BYD", brand])],
+            "Codename": [f"{brand[:3].lower()}{inst_id}"],
+        },
+        "Physical Attributes": {
+            "Width": [f"{rng.randint(65, 80)} mm"],
+            "Height": [f"{rng.randint(140, 170)} mm"],
+            "Depth": [f"{rng.uniform(7, 10):.1f} mm"],
+            "Mass": [f"{rng.randint(150, 250)} g"],
+        },
+        "Software Environment": {
+            "Platform": ["Android" if "Android" in (os_name := rng.choice(_OS)) else "iOS"],
+            "Operating System": [os_name],
+        },
+        "Application processor, Chipset": {
+            "CPU Clock": [f"{rng.randint(1800, 3300)} MHz"],
+            "CPU": [rng.choice(_CHIPSETS)],
+            "Width of Machine Word": ["64 bit"],
+            "CPU Core(s)": [str(rng.choice([4, 6, 8]))],
+            "GPU": [rng.choice(["Qualcomm Adreno 750", "ARM Mali-G720 MP12", "Apple GPU"])],
+        },
+        "Operative Memory": {
+            "RAM Type": ["LPDDR5X SDRAM"],
+            "RAM Capacity": [f"{rng.choice([4096, 6144, 8192, 12288, 16384])} MiB RAM"],
+        },
+        "Non-volatile Memory": {
+            "Non-volatile Memory Interface": ["UFS 4.0"],
+            "Non-volatile Memory Capacity": [f"{rng.choice([64, 128, 256, 512])} GB"],
+        },
+        "Display": {
+            "Display Diagonal": [f"{rng.uniform(5.5, 7):.2f} \""],
+            "Resolution": [rng.choice(_RESOLUTIONS)],
+            "Display Type": [rng.choice(_DISPLAY_TYPES)],
+            "Display Refresh Rate": [f"{rng.choice([60, 90, 120, 144])} Hz"],
+            "Pixel Density": [f"{rng.randint(260, 560)} PPI"],
+        },
+        "Cellular Phone": {
+            "Supported Cellular Bands": [f"GSM{band}" for band in rng.sample([850, 900, 1800, 1900], 3)],
+            "Supported Cellular Data Links": ["GPRS", "EDGE", "UMTS", "HSPA+", "LTE", "NR"],
+            "SIM Card Slot": ["Nano-SIM (4FF)"],
+        },
+        "Main Camera": {
+            "Camera Image Sensor": ["CMOS"],
+            "Number of effective pixels": [f"{rng.choice([12, 48, 50, 108, 200])} MP camera"],
+            "Aperture (W)": [f"f/{rng.uniform(1.4, 2.4):.1f}"],
+        },
+        "Built-in Sensors": {
+            "Built-in accelerometer": ["3D"],
+            "Built-in gyroscope": ["3D"],
+            "Built-in compass": ["3D"],
+        },
+        "Power Supply": {
+            "Battery": ["Li-ion polymer"],
+            "Nominal Battery Capacity": [f"{rng.randint(3000, 6000)} mAh battery"],
+        },
+        "Geographical Attributes": {
+            "Market Countries": rng.sample(_COUNTRIES, 4),
+            "Market Regions": ["Asia", "Europe"],
+        },
+        "Datasheet Attributes": {
+            "Data Integrity": ["Final"],
+            "Added": [f"{year}-01-{rng.randint(10, 28)}"],
+        },
+    }
+
+
+def make_database(size: int, seed: int = 0, missing_ratio: float = 0.05) -> MemoryDatabase:
+    """
+    :param size: 实例数量
+    :param missing_ratio: 404 占位记录的比例
+    """
+    rng = random.Random(seed)
+    database = MemoryDatabase()
+    for inst_id in range(1, size + 1):
+        inst_meta = InstMeta(InstCat.DEVICE, inst_id)
+        if rng.random() < missing_ratio:
+            database.add_data(inst_meta, {"Meta": {"Image": None}})
+        else:
+            database.add_data(inst_meta, make_instance(rng, inst_id))
+    return database
+
+
+def make_query_form(options_per_field: int = 40) -> str:
+    """
+    生成与查询页结构一致的表单 (第二个 <form>), 包含下拉框、文本框、范围与复选框组
+    """
+    items = []
+    for i in range(20):
+        options = "".join(f'<option value="{j}">Option {i}-{j} [{j * 3}]</option>' for j in range(1, options_per_field))
+        items.append(
+            f'<div class="form_item"><strong>Select Field {i}:</strong>'
+            f'<select name="sel_{i}"><option value="" selected>-</option>{options}</select></div>'
+        )
+    for i in range(10):
+        items.append(f'<div class="form_item"><strong>Text Field {i}:</strong><input type="text" name="txt_{i}" value=""></div>')
+    for i in range(10):
+        items.append(
+            f'<div class="form_item"><strong>Range Field {i}:</strong>'
+            f'<input type="text" name="rng_{i}_min" value=""><input type="text" name="rng_{i}_max" value=""></div>'
+        )
+    for i in range(10):
+        boxes = "".join(
+            f'<div class="form_item"><input type="checkbox" name="chk_{i}[]" id="chk_{i}_{j}" value="{j}">'
+            f'<label for="chk_{i}_{j}">Choice {i}-{j} [{j}]</label></div>'
+            for j in range(options_per_field)
+        )
+        items.append(f'<div class="form_desc"><strong>Checkbox Field {i}:</strong></div>{boxes}')
+    return (
+        "<html><body><form action=\"index.php\"><input type=\"text\" name=\"search_exp\"></form>"
+        f"<form action=\"index.php?m=device&s=query\" method=\"post\">{''.join(items)}"
+        "<button type=\"submit\" name=\"result_submit\" value=\"1\">Submit</button></form></body></html>"
+    )
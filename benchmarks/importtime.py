@@ -0,0 +1,88 @@
+"""
+导入耗时基准: 以 python -X importtime 在全新的解释器中测量, 并检查只使用数据库时不会导入网络与 HTML 解析栈
+
+用法:
+    python benchmarks/importtime.py                     # 输出各场景的导入耗时
+    python benchmarks/importtime.py --max-ms 150        # 超过上限或导入了重型模块时退出码为 1
+"""
+import argparse
+import functools
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ("curl_cffi", "lxml", "bs4", "aiohttp")
+
+SCENARIOS = {
+    "import": "import phonedb_api",
+    "database": "from phonedb_api import PickleDatabase, MemoryDatabase, Query, QueryStrategy",
+    "session": "from phonedb_api import PhoneDBHTTPSession",
+}
+
+# 只使用数据库的场景不应导入的模块
+LIGHT_SCENARIOS = ("import", "database")
+
+
+def _run(statement: str) -> list[tuple[str, int, bool]]:
+    """
+    :return: 每个被导入的模块的 (名称, 累计耗时 (微秒), 是否为顶层导入)
+    """
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    env = os.environ | {"PYTHONPATH": os.pathsep.join(filter(None, (src, os.environ.get("PYTHONPATH"))))}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=env, capture_output=True, text=True, check=True
+    )
+    result = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        result.append((name.strip(), int(cumulative), len(name) - len(name.lstrip()) == 1))
+    return result
+
+
+@functools.cache
+def _startup_modules() -> frozenset[str]:
+    """
+    解释器启动时 (site 等) 就会导入的模块, 不计入耗时
+    """
+    return frozenset(name for name, _, _ in _run("pass"))
+
+
+def measure_import(statement: str, repeat: int = 5) -> tuple[float, set[str]]:
+    """
+    :return: 多次运行中最快一次的导入耗时 (秒), 以及导入的顶层包
+    """
+    best = float("inf")
+    modules: set[str] = set()
+    for _ in range(repeat):
+        imported = [item for item in _run(statement) if item[0] not in _startup_modules()]
+        best = min(best, sum(cumulative for _, cumulative, top_level in imported if top_level) / 1_000_000)
+        modules = {name.split(".")[0] for name, _, _ in imported}
+    return best, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="import 场景的耗时上限 (毫秒)")
+    args = parser.parse_args()
+
+    failed = False
+    for scenario, statement in SCENARIOS.items():
+        seconds, modules = measure_import(statement, args.repeat)
+        heavy = sorted(modules.intersection(HEAVY_MODULES))
+        print(f"{scenario:10s} {seconds * 1000:8.1f} ms  heavy: {', '.join(heavy) or '-'}")
+        if scenario in LIGHT_SCENARIOS and heavy:
+            print(f"  {scenario} imports {', '.join(heavy)}", file=sys.stderr)
+            failed = True
+        if scenario == "import" and args.max_ms is not None and seconds * 1000 > args.max_ms:
+            print(f"  import takes {seconds * 1000:.1f} ms > {args.max_ms} ms", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
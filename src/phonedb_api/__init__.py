@@ -1,9 +1,74 @@
+import importlib
+from typing import TYPE_CHECKING
+
 from .language import LangClass, LangClassEnUS, LangClassZhCN
 
-from .phonedb import *
 from .instance import *
 from .runner import *
 from .database import *
+from .refresh import *
+from .checkpoint import *
+from .cache import *
+from .metrics import *
+
+if TYPE_CHECKING:
+    from .phonedb import *
+    from .parse import *
+    from .transport import *
+    from .retry import *
+    from .crawler import *
+    from .replay import *
+    from .profiling import *
+    from .fake_server import *
+    from .server import *
+
+# 依赖网络与 HTML 解析栈 (curl_cffi, lxml, bs4, aiohttp) 的模块在首次访问其中的名称时才导入,
+# 只使用数据库的程序因此无需承担这些模块的导入开销
+_LAZY_MODULES = {
+    "phonedb": ["AbstractPhoneDBSession", "PhoneDBHTTPSession", "SyncResult"],
+    "parse": ["InstanceParser", "QueryFormParser"],
+    "transport": [
+        "AbstractTransport", "CurlCffiTransport", "TransportError", "TransportResponse", "TransportStats", "encode_form"
+    ],
+    "retry": ["CircuitBreaker", "HTTPStatusError", "RetryBudget", "RetryPolicy"],
+    "crawler": ["ShardedCrawler", "WorkerProgress"],
+    "replay": [
+        "FaultInjector", "NOT_FOUND_PAGE", "PageStore", "RecordingStore", "RecordingTransport", "ReplayTransport",
+        "SyntheticStore", "render_detail_page", "render_list_page", "request_key"
+    ],
+    "profiling": ["PROFILE_ENV", "SessionProfiler", "database_memory", "deep_sizeof"],
+    "fake_server": ["FakePhoneDBServer"],
+    "server": ["QueryError", "QueryServer", "parse_query_params", "serve"],
+}
+_LAZY_NAMES = {name: module for module, names in _LAZY_MODULES.items() for name in names}
+
+__all__ = [
+    "LangClass", "LangClassEnUS", "LangClassZhCN",
+    "PAGE_SIZE", "InstCat", "InstMeta", "Instance",
+    "TaskResult", "RunnerItem", "AbstractAsyncRunner", "AsyncSerialRunner", "AsyncParallelRunner",
+    "AsyncOrderedParallelRunner", "AsyncFairRunner", "Lane", "LaneStats",
+    "QueryStrategy", "Query", "RecordInfo", "content_hash", "PredicateProfile", "QueryProfile",
+    "match_query", "match_predicate", "AbstractDatabase", "MemoryDatabase", "JsonDatabase", "PickleDatabase",
+    "RefreshPolicy", "RefreshResult", "RefreshScheduler",
+    "CrawlCheckpoint",
+    "CacheEntry", "WebsiteCache",
+    "Histogram", "CrawlMetrics", "MetricsHook", "ProgressSnapshot", "ProgressReporter", "log_progress",
+    *_LAZY_NAMES,
+]
+
+
+def __getattr__(name: str):
+    if (module := _LAZY_NAMES.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # 缓存到模块命名空间, 之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(globals().keys() | _LAZY_NAMES.keys())
+
 
 __version__ = "0.3.0"
 __author__ = "YunXi_awa"
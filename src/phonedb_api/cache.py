@@ -0,0 +1,82 @@
+import dataclasses
+import time
+from typing import Any
+
+import aiofiles
+import aiofiles.ospath
+import ujson
+from loguru import logger
+
+from .instance import InstCat
+
+
+@dataclasses.dataclass(slots=True)
+class CacheEntry:
+    cached_at: float
+    count: int
+    ids: list[int]
+
+
+class WebsiteCache:
+    """
+    网站搜索/查询结果缓存, 键为 (类别, 规范化后的搜索表达式或查询参数)
+    """
+
+    def __init__(self, filepath: str | None = None, ttl: float = 24 * 60 * 60, revalidate: bool = False):
+        """
+        :param filepath: 持久化文件路径, 为 None 时仅缓存在内存中
+        :param ttl: 缓存有效期 (秒)
+        :param revalidate: 为 True 时, 命中缓存前先请求第一页比对结果数;
+                           结果数一致则直接使用缓存 (过期的缓存也可以借此续期)
+        """
+        self.filepath = filepath
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self._entries: dict[str, CacheEntry] = {}
+
+    @staticmethod
+    def make_key(inst_cat: InstCat, kind: str, query: str | dict[str, Any]) -> str:
+        """
+        :param kind: "search"、"query" 或 "list"
+        :param query: 搜索表达式 (忽略大小写与多余空白) 或查询参数 (忽略键顺序)
+        """
+        if isinstance(query, str):
+            normalized = " ".join(query.lower().split())
+        else:
+            normalized = ujson.dumps(query, sort_keys=True, ensure_ascii=False)
+        return f"{inst_cat}:{kind}:{normalized}"
+
+    def get(self, key: str) -> CacheEntry | None:
+        return self._entries.get(key)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.cached_at < self.ttl
+
+    def set(self, key: str, count: int, ids: list[int]):
+        self._entries[key] = CacheEntry(time.time(), count, ids)
+
+    def touch(self, key: str):
+        if (entry := self._entries.get(key)) is not None:
+            entry.cached_at = time.time()
+
+    def clear(self):
+        self._entries = {}
+
+    async def load(self):
+        if self.filepath is None:
+            return
+        if not await aiofiles.ospath.exists(self.filepath):
+            logger.warning(f"Cache file {self.filepath} not found, skip loading.")
+            return
+        async with aiofiles.open(self.filepath, "r") as f:
+            raw = ujson.loads(await f.read() or "{}")
+        self._entries = {key: CacheEntry(*value) for key, value in raw.items()}
+
+    async def dump(self):
+        if self.filepath is None:
+            return
+        async with aiofiles.open(self.filepath, "w") as f:
+            await f.write(ujson.dumps(
+                {key: [entry.cached_at, entry.count, entry.ids] for key, entry in self._entries.items()},
+                ensure_ascii=False
+            ))
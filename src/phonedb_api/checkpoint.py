@@ -0,0 +1,117 @@
+import os
+import time
+
+import aiofiles
+import aiofiles.ospath
+import ujson
+from loguru import logger
+
+from .database import AbstractDatabase
+from .instance import InstCat, InstMeta
+
+
+class CrawlCheckpoint:
+    """
+    爬取进度文件, 记录已完成、失败 (含失败次数) 与进行中的实例ID, 用于中断后恢复
+    """
+
+    def __init__(self, filepath: str, flush_interval: float = 30.0, flush_every: int = 1000):
+        """
+        :param filepath: 进度文件路径
+        :param flush_interval: 距上次写入超过该秒数时写入
+        :param flush_every: 累计该数量的变更时写入
+        """
+        self.filepath = filepath
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+
+        self.completed: set[tuple[InstCat, int]] = set()
+        self.failed: dict[tuple[InstCat, int], int] = {}
+        self.pending: set[tuple[InstCat, int]] = set()
+
+        self._changes = 0
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _key(inst_meta: InstMeta) -> tuple[InstCat, int]:
+        return inst_meta.inst_cat, inst_meta.inst_id
+
+    def mark_pending(self, inst_meta: InstMeta):
+        self.pending.add(self._key(inst_meta))
+        self._changes += 1
+
+    def mark_completed(self, inst_meta: InstMeta):
+        key = self._key(inst_meta)
+        self.pending.discard(key)
+        self.failed.pop(key, None)
+        self.completed.add(key)
+        self._changes += 1
+
+    def mark_failed(self, inst_meta: InstMeta):
+        key = self._key(inst_meta)
+        self.pending.discard(key)
+        self.failed[key] = self.failed.get(key, 0) + 1
+        self._changes += 1
+
+    def remaining(self, max_failures: int | None = None) -> list[InstMeta]:
+        """
+        :param max_failures: 失败次数达到该值的实例不再重试
+        :return: 尚未完成的实例; 从未失败的在前, 失败过的按失败次数升序排在后面
+        """
+        failed = sorted(
+            (count, key) for key, count in self.failed.items()
+            if key not in self.completed and (max_failures is None or count < max_failures)
+        )
+        pending = sorted(key for key in self.pending if key not in self.failed and key not in self.completed)
+        return [InstMeta(*key) for key in pending] + [InstMeta(*key) for _, key in failed]
+
+    async def load(self):
+        if not await aiofiles.ospath.exists(self.filepath):
+            logger.warning(f"Checkpoint file {self.filepath} not found, start from scratch.")
+            return
+        async with aiofiles.open(self.filepath, "r") as f:
+            state = ujson.loads(await f.read() or "{}")
+
+        def parse(key: str) -> tuple[InstCat, int]:
+            inst_cat, inst_id = key.rsplit(":", 1)
+            return InstCat(inst_cat), int(inst_id)
+
+        self.completed = {parse(key) for key in state.get("completed", [])}
+        self.failed = {parse(key): count for key, count in state.get("failed", {}).items()}
+        self.pending = {parse(key) for key in state.get("pending", [])}
+        self._changes = 0
+
+    def lost(self, database: AbstractDatabase) -> list[InstMeta]:
+        """
+        :return: 标记为已完成但不在数据库中的实例 (进程在数据库写入文件前退出)
+        """
+        return [InstMeta(*key) for key in sorted(self.completed) if InstMeta(*key) not in database]
+
+    def due(self) -> bool:
+        """
+        :return: 变更足够多或距上次写入足够久, 下次 flush 将写入
+        """
+        return self._changes >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval
+
+    async def flush(self, force: bool = False):
+        """
+        变更足够多或距上次写入足够久时写入进度文件; force 为 True 时总是写入
+        """
+        if not force and not self.due():
+            return
+
+        def dump(key: tuple[InstCat, int]) -> str:
+            return f"{key[0]}:{key[1]}"
+
+        state = {
+            "completed": [dump(key) for key in self.completed],
+            "failed": {dump(key): count for key, count in self.failed.items()},
+            "pending": [dump(key) for key in self.pending],
+        }
+        # 先写临时文件再替换, 避免进程在写入中途退出导致文件损坏
+        tmp_filepath = f"{self.filepath}.tmp"
+        async with aiofiles.open(tmp_filepath, "w") as f:
+            await f.write(ujson.dumps(state))
+        os.replace(tmp_filepath, self.filepath)
+        self._changes = 0
+        self._last_flush = time.monotonic()
@@ -0,0 +1,225 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+from typing import Any, Callable, Sequence
+
+from loguru import logger
+
+from .database import AbstractDatabase, MemoryDatabase, PickleDatabase
+from .instance import InstCat, InstMeta
+from .phonedb import PhoneDBHTTPSession
+from .runner import AsyncParallelRunner
+
+
+@dataclasses.dataclass(slots=True)
+class WorkerProgress:
+    worker: int
+    total: int
+    done: int = 0
+    failed: int = 0
+    finished: bool = False
+    # 失败的实例, 仅在最终进度 (finished 为 True) 中给出
+    failed_ids: dict[InstCat, list[int]] = dataclasses.field(default_factory=dict)
+
+
+class ShardedCrawler:
+    """
+    多进程分片爬取: 将各类别的ID范围交错分给 N 个工作进程,
+    每个进程拥有独立的会话、执行器与临时分片数据库, 完成后流式合并到主数据库
+    """
+
+    def __init__(
+            self,
+            database: AbstractDatabase,
+            workers: int = os.process_cpu_count(),
+            max_workers_per_process: int = 32,
+            shard_dir: str | None = None,
+            progress_callback: Callable[[WorkerProgress], None] | None = None,
+            progress_interval: float = 5.0,
+            **session_kwargs
+    ):
+        """
+        :param database: 合并目标数据库
+        :param workers: 工作进程数
+        :param max_workers_per_process: 每个进程内执行器的并发数
+        :param shard_dir: 分片数据库目录, 默认为临时目录
+        :param progress_callback: 接收各进程进度的回调, 默认写日志
+        :param progress_interval: 工作进程上报进度的间隔 (秒)
+        :param session_kwargs: 传递给工作进程中 PhoneDBHTTPSession 的参数, 必须可被 pickle
+        """
+        self.database = database
+        self.workers = workers or 1
+        self.max_workers_per_process = max_workers_per_process
+        self.shard_dir = shard_dir
+        self.progress_callback = progress_callback or self._log_progress
+        self.progress_interval = progress_interval
+        self.session_kwargs = session_kwargs
+        self.progress: dict[int, WorkerProgress] = {}
+
+    @staticmethod
+    def _log_progress(progress: WorkerProgress):
+        logger.info(
+            f"Worker {progress.worker}: {progress.done}/{progress.total}, failed {progress.failed}"
+            + (", finished" if progress.finished else "")
+        )
+
+    @property
+    def failed(self) -> dict[InstCat, list[int]]:
+        """
+        :return: 上次 crawl 中各类别失败的ID, 可直接传给 crawl 重试
+        """
+        failed: dict[InstCat, list[int]] = {}
+        for progress in self.progress.values():
+            for inst_cat, inst_ids in progress.failed_ids.items():
+                failed.setdefault(inst_cat, []).extend(inst_ids)
+        return {inst_cat: sorted(inst_ids) for inst_cat, inst_ids in failed.items()}
+
+    def split(self, ranges: dict[InstCat, Sequence[int]]) -> list[dict[InstCat, Sequence[int]]]:
+        """
+        交错切分, 使每个分片都包含新旧ID, 负载更均衡
+        """
+        return [
+            {inst_cat: id_range[worker::self.workers] for inst_cat, id_range in ranges.items()}
+            for worker in range(self.workers)
+        ]
+
+    async def crawl(self, ranges: dict[InstCat, Sequence[int]]) -> dict[int, WorkerProgress]:
+        """
+        :param ranges: 各类别需要爬取的ID范围, 例如 {InstCat.DEVICE: range(1, latest_id + 1)}, 也可以是ID列表
+        :return: 各进程的最终进度, 其中 failed_ids 为该进程失败的ID; 汇总见 failed
+        """
+        shard_dir = self.shard_dir or tempfile.mkdtemp(prefix="phonedb_shards_")
+        os.makedirs(shard_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        self.progress = {}
+
+        with multiprocessing.Manager() as manager:
+            pool = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            progress_queue = manager.Queue()
+            futures = [
+                loop.run_in_executor(
+                    pool,
+                    _crawl_shard,
+                    worker,
+                    shard,
+                    os.path.join(shard_dir, f"shard_{worker}.pkl"),
+                    self.max_workers_per_process,
+                    self.session_kwargs,
+                    progress_queue,
+                    self.progress_interval
+                )
+                for worker, shard in enumerate(self.split(ranges))
+            ]
+            reporter = asyncio.create_task(self._report(progress_queue))
+            try:
+                # 按完成顺序逐个合并分片, 同一时刻只加载一个分片
+                for future in asyncio.as_completed(futures):
+                    await self._merge(await future)
+            except BaseException:
+                # 出错时不等待其余工作进程: 在事件循环线程中等待会阻塞循环,
+                # 而工作进程可能正依赖同一循环上的服务 (如 FakePhoneDBServer); 仍在运行的进程直接终止
+                processes = list((pool._processes or {}).values())
+                pool.shutdown(wait=False, cancel_futures=True)
+                for process in processes:
+                    process.terminate()
+                for future in futures:
+                    future.cancel()
+                raise
+            else:
+                # 所有分片均已完成, 无需等待
+                pool.shutdown()
+            finally:
+                reporter.cancel()
+                self._drain(progress_queue)
+        if self.shard_dir is None and not os.listdir(shard_dir):
+            os.rmdir(shard_dir)
+        return self.progress
+
+    async def _report(self, progress_queue: Any):
+        while True:
+            self._drain(progress_queue)
+            await asyncio.sleep(self.progress_interval)
+
+    def _drain(self, progress_queue: Any):
+        while True:
+            try:
+                progress = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.progress[progress.worker] = progress
+            self.progress_callback(progress)
+
+    async def _merge(self, shard_path: str):
+        shard = PickleDatabase(shard_path)
+        await shard.load()
+        count = 0
+        for inst_cat, instances in shard.get_all_data().items():
+            for inst_id, data in instances.items():
+                inst_meta = InstMeta(InstCat(inst_cat), int(inst_id))
+                # 保留分片中的抓取时间, 而不是以合并时间作为抓取时间
+                if isinstance(self.database, MemoryDatabase) and (info := shard.get_record_info(inst_meta)) is not None:
+                    self.database.add_data(inst_meta, data, fetched_at=info.fetched_at)
+                else:
+                    self.database.add_data(inst_meta, data)
+                count += 1
+        logger.info(f"Merged {count} instances from {shard_path}.")
+        for path in (shard.filepath, shard.records_filepath):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _crawl_shard(
+        worker: int,
+        shard: dict[InstCat, Sequence[int]],
+        shard_path: str,
+        max_workers: int,
+        session_kwargs: dict[str, Any],
+        progress_queue: Any,
+        progress_interval: float
+) -> str:
+    """
+    工作进程入口
+    """
+    return asyncio.run(
+        _crawl_shard_async(worker, shard, shard_path, max_workers, session_kwargs, progress_queue, progress_interval)
+    )
+
+
+async def _crawl_shard_async(
+        worker: int,
+        shard: dict[InstCat, Sequence[int]],
+        shard_path: str,
+        max_workers: int,
+        session_kwargs: dict[str, Any],
+        progress_queue: Any,
+        progress_interval: float
+) -> str:
+    progress = WorkerProgress(worker, sum(len(id_range) for id_range in shard.values()))
+    inst_metas = (InstMeta(inst_cat, inst_id) for inst_cat, id_range in shard.items() for inst_id in id_range)
+    last_report = time.monotonic()
+    failed_ids: dict[InstCat, list[int]] = {}
+
+    async with PhoneDBHTTPSession(
+            AsyncParallelRunner(max_workers=max_workers),
+            PickleDatabase(shard_path),
+            **session_kwargs
+    ) as session:
+        async for task_result in session.get_data_stream(inst_metas, return_exceptions=True):
+            if task_result.ok:
+                progress.done += 1
+            else:
+                progress.failed += 1
+                failed_ids.setdefault(task_result.key.inst_cat, []).append(task_result.key.inst_id)
+            if time.monotonic() - last_report >= progress_interval:
+                progress_queue.put(dataclasses.replace(progress))
+                last_report = time.monotonic()
+
+    progress.finished = True
+    progress.failed_ids = failed_ids
+    progress_queue.put(progress)
+    return shard_path
@@ -1,4 +1,7 @@
+import dataclasses
+import hashlib
 import pickle
+import time
 from abc import ABC, abstractmethod
 from enum import StrEnum
 import re
@@ -8,6 +11,7 @@ import ujson
 from loguru import logger
 
 from .instance import InstMeta, InstCat, Instance
+from .language import LangClass
 
 
 class QueryStrategy(StrEnum):
@@ -25,7 +29,111 @@ class Query:
         self.strategy = strategy
 
 
+@dataclasses.dataclass(slots=True)
+class RecordInfo:
+    """
+    记录的抓取信息
+    """
+    fetched_at: float
+    content_hash: str
+
+
+def content_hash(data: dict) -> str:
+    return hashlib.blake2b(ujson.dumps(data, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+@dataclasses.dataclass(slots=True)
+class PredicateProfile:
+    """
+    单个查询条件 (某分类下某字段的一组 Query) 的执行统计
+    """
+    section: str
+    field: str
+    strategies: list[QueryStrategy]
+    # 被求值的次数; 前面的条件已不匹配时短路, 不会求值
+    evaluations: int = 0
+    matches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def selectivity(self) -> float:
+        """
+        :return: 通过该条件的比例, 越小说明该条件淘汰的实例越多
+        """
+        return self.matches / self.evaluations if self.evaluations else 0.0
+
+
+@dataclasses.dataclass(slots=True)
+class QueryProfile:
+    """
+    query_data / search_data 的执行计划与统计 (explain=True 时返回)
+    """
+    inst_cat: InstCat
+    scanned: int = 0
+    returned: int = 0
+    elapsed: float = 0.0
+    index_used: bool = False
+    predicates: list[PredicateProfile] = dataclasses.field(default_factory=list)
+
+    @property
+    def selectivity(self) -> float:
+        return self.returned / self.scanned if self.scanned else 0.0
+
+    def __str__(self):
+        lines = [
+            f"{self.inst_cat}: scanned {self.scanned}, returned {self.returned} ({self.selectivity:.2%}), "
+            f"{self.elapsed * 1000:.2f} ms, index {'used' if self.index_used else 'not used'}"
+        ]
+        for predicate in self.predicates:
+            lines.append(
+                f"  {predicate.section} / {predicate.field} [{', '.join(predicate.strategies)}]: "
+                f"evaluated {predicate.evaluations}, matched {predicate.matches} ({predicate.selectivity:.2%}), "
+                f"{predicate.elapsed * 1000:.2f} ms"
+            )
+        return "\n".join(lines)
+
+
+def match_query(query: Query, inst_values: list[str]) -> bool:
+    """
+    :return: 字段的任一值是否满足该 Query
+    """
+    match query.strategy:
+        case QueryStrategy.CONTAINS:
+            return any(query.query.lower() in inst_value.lower() for inst_value in inst_values)
+        case QueryStrategy.EQUALS:
+            return any(query.query.lower() == inst_value.lower() for inst_value in inst_values)
+        case QueryStrategy.AT_LEAST:
+            return any(int(query.query.lower()) <= int(inst_value) for inst_value in inst_values)
+        case QueryStrategy.WITHOUT_UNIT_AT_LEAST:
+            return any(int(query.query.lower()) <= int("".join(filter(lambda x: x.isdigit(), inst_value.split()))) for inst_value in inst_values)
+        case QueryStrategy.DISPLAY_RESOLUTION_AT_LEAST:
+            for inst_value in inst_values:
+                # 判断是否为分辨率格式
+                try:
+                    primary_resolution, secondary_resolution = int((k:=inst_value.split("x"))[0]), int(k[1])
+                    primary_param_resolution, secondary_param_resolution = int((k:=query.query.split("x"))[0]), int(k[1])
+                except ValueError:
+                    continue
+                if primary_resolution >= primary_param_resolution and secondary_resolution >= secondary_param_resolution:
+                    return True
+    return False
+
+
+def match_predicate(inst_data: dict, section: str, field: str, queries: list[Query]) -> bool:
+    """
+    :return: 实例在 section/field 下的值是否满足任一 Query; 分类或字段不存在时不满足
+    """
+    if (inst_section_data := inst_data.get(section)) is None:
+        return False
+    if (inst_values := inst_section_data.get(field)) is None:
+        return False
+    return any(match_query(query, inst_values) for query in queries)
+
+
 class AbstractDatabase(ABC):
+    # 数据版本, 实现应在每次修改后递增, 供派生的索引与缓存判断是否失效
+    version: int = 0
+
     @abstractmethod
     def get_all_data(self) -> dict:
         pass
@@ -47,13 +155,29 @@ class AbstractDatabase(ABC):
         pass
 
     @abstractmethod
-    def search_data(self, inst_cat: InstCat, query: str) -> list[tuple[int, dict]]:
+    def search_data(
+            self, inst_cat: InstCat, query: str, explain: bool = False, lang: LangClass | None = None
+    ) -> list[tuple[int, dict]] | tuple[list[tuple[int, dict]], QueryProfile]:
         pass
 
     @abstractmethod
-    def query_data(self, inst_cat: InstCat, params: dict) -> list[Instance]:
+    def query_data(
+            self, inst_cat: InstCat, params: dict, explain: bool = False, lang: LangClass | None = None
+    ) -> list[Instance] | tuple[list[Instance], QueryProfile]:
         pass
 
+    def max_id(self, inst_cat: InstCat) -> int:
+        """
+        :return: 该类别下已存储的最大实例ID, 无数据时为 0
+        """
+        return max((int(inst_id) for inst_id in self.get_all_data().get(inst_cat, {})), default=0)
+
+    def get_record_info(self, inst_meta: InstMeta) -> RecordInfo | None:
+        """
+        :return: 记录的抓取时间与内容哈希, 未知时为 None
+        """
+        return None
+
     async def load(self):
         pass
 
@@ -66,42 +190,128 @@ class MemoryDatabase(AbstractDatabase):
         self._data: dict[InstCat, dict[str, dict[str, dict[str, list[str]]]]] = {}
         #                Category      ID        Section   Field    Values
         # Example: self._data[InstCat.DEVICE]["123456"]["Display"]["Resolution"] = ["1920x1080", "1366x768"]
+        self._records: dict[InstCat, dict[str, RecordInfo]] = {}
+        # 数据版本, 每次修改后递增, 用于使派生的索引失效
+        self.version = 0
+        # (语言代码, 类别) -> (构建时的版本, 小写叶子文本 -> 实例ID列表)
+        self._search_indexes: dict[tuple[str, InstCat], tuple[int, dict[str, list[str]]]] = {}
 
     def get_all_data(self) -> dict:
         return self._data
 
     def __contains__(self, item):
-        return str(item.meta.inst_id) in self._data.get(item.meta.inst_cat, {})
+        meta = item.meta if isinstance(item, Instance) else item
+        return str(meta.inst_id) in self._data.get(meta.inst_cat, {})
 
     def get_data(self, inst_meta: InstMeta) -> dict:
         return self._data[inst_meta.inst_cat][str(inst_meta.inst_id)]
 
-    def add_data(self, inst_meta: InstMeta, data: dict):
+    def add_data(self, inst_meta: InstMeta, data: dict, fetched_at: float | None = None):
         self._data.setdefault(inst_meta.inst_cat, {})[str(inst_meta.inst_id)] = data
+        self._records.setdefault(inst_meta.inst_cat, {})[str(inst_meta.inst_id)] = RecordInfo(
+            time.time() if fetched_at is None else fetched_at,
+            content_hash(data)
+        )
+        self.version += 1
 
     def clear(self):
         self._data = {}
-
-    def search_data(self, inst_cat: InstCat, query: str) -> list[dict]:
+        self._records = {}
+        self.version += 1
+
+    def get_record_info(self, inst_meta: InstMeta) -> RecordInfo | None:
+        return self._records.get(inst_meta.inst_cat, {}).get(str(inst_meta.inst_id))
+
+    def _dump_records(self) -> dict:
+        return {
+            inst_cat: {inst_id: [info.fetched_at, info.content_hash] for inst_id, info in records.items()}
+            for inst_cat, records in self._records.items()
+        }
+
+    def _load_records(self, raw: dict):
+        self._records = {
+            inst_cat: {inst_id: RecordInfo(*info) for inst_id, info in records.items()}
+            for inst_cat, records in raw.items()
+        }
+
+    def search_data(
+            self, inst_cat: InstCat, query: str, explain: bool = False, lang: LangClass | None = None
+    ) -> list[tuple[int, dict]] | tuple[list[tuple[int, dict]], QueryProfile]:
         """
         搜索数据库中符合条件的所有数据项。
 
         :param inst_cat: 实例类别，用于指定搜索的实例类别。
         :param query: 查询字符串，用于匹配实例ID或数据中的内容。
+        :param explain: 为 True 时同时返回 QueryProfile。
+        :param lang: 指定时同时匹配值的译文，经由该语言的索引完成。
         :return: 一个列表，包含所有符合条件的数据项。
         """
+        if lang is not None and lang.translations:
+            return self._search_translated(inst_cat, query, explain, lang)
+        start = time.perf_counter()
         # 初始化一个空列表，用于存储符合条件的数据项
         result = []
+        scanned = evaluated = 0
 
         # 获取大分类下的所有ID
         for inst_id, inst_data in self._data.get(inst_cat, {}).items():
+            scanned += 1
             if inst_data["Meta"]["Image"] is None:
                 continue
+            evaluated += 1
             for leaf in self.iter_deep_traverse(inst_data):
                 if query.lower() in leaf.lower():
                     result.append((int(inst_id), inst_data))
                     break
-        return result
+        if not explain:
+            return result
+
+        elapsed = time.perf_counter() - start
+        # 全文搜索只有一个条件, 占位记录不参与求值
+        predicate = PredicateProfile("*", "*", [QueryStrategy.CONTAINS], evaluated, len(result), elapsed)
+        return result, QueryProfile(inst_cat, scanned, len(result), elapsed, False, [predicate])
+
+    def _search_translated(
+            self, inst_cat: InstCat, query: str, explain: bool, lang: LangClass
+    ) -> list[tuple[int, dict]] | tuple[list[tuple[int, dict]], QueryProfile]:
+        """
+        通过 (语言, 类别) 的值索引搜索: 只需扫描去重后的叶子文本 (原文与译文), 无需在查询时翻译每个叶子
+        """
+        start = time.perf_counter()
+        index = self._search_index(inst_cat, lang)
+        query = query.lower()
+        matched = set()
+        for text, inst_ids in index.items():
+            if query in text:
+                matched.update(inst_ids)
+        # 按数据库中的顺序产出, 与未使用索引时一致
+        instances = self._data.get(inst_cat, {})
+        result = [(int(inst_id), inst_data) for inst_id, inst_data in instances.items() if inst_id in matched]
+        if not explain:
+            return result
+
+        elapsed = time.perf_counter() - start
+        predicate = PredicateProfile("*", "*", [QueryStrategy.CONTAINS], len(index), len(result), elapsed)
+        return result, QueryProfile(inst_cat, len(instances), len(result), elapsed, True, [predicate])
+
+    def _search_index(self, inst_cat: InstCat, lang: LangClass) -> dict[str, list[str]]:
+        key = (lang.code, inst_cat)
+        if (cached := self._search_indexes.get(key)) is not None and cached[0] == self.version:
+            return cached[1]
+        translations = lang.translations
+        index: dict[str, list[str]] = {}
+        for inst_id, inst_data in self._data.get(inst_cat, {}).items():
+            if inst_data["Meta"]["Image"] is None:
+                continue
+            texts = set()
+            for leaf in self.iter_deep_traverse(inst_data):
+                texts.add(leaf.lower())
+                if (translated := translations.get(leaf)) is not None:
+                    texts.add(translated.lower())
+            for text in texts:
+                index.setdefault(text, []).append(inst_id)
+        self._search_indexes[key] = (self.version, index)
+        return index
 
     @staticmethod
     def iter_deep_traverse(data):
@@ -131,106 +341,141 @@ class MemoryDatabase(AbstractDatabase):
             else:
                 yield current_node
 
-    def query_data(self, inst_cat: InstCat, params: dict[str, dict[str, list[Query]]]) -> list[Instance]:
+    def query_data(
+            self,
+            inst_cat: InstCat,
+            params: dict[str, dict[str, list[Query]]],
+            explain: bool = False,
+            lang: LangClass | None = None
+    ) -> list[Instance] | tuple[list[Instance], QueryProfile]:
         """
         查询数据库中符合条件的所有实例元数据。
 
         :param inst_cat: 实例类别，用于指定查询的实例类别。
         :param params: 查询参数，用于匹配实例数据中的内容。
+        :param explain: 为 True 时同时返回 QueryProfile，包含每个条件的求值次数、选择率与耗时。
+        :param lang: 指定时 params 中的分类名与字段名可以使用该语言的译文; 查询值按原文匹配。
         :return: 一个列表，包含所有符合条件的实例元数据。
         """
-        # 初始化一个空列表，用于存储符合条件的实例元数据
-        result = set()
+        start = time.perf_counter()
+        if lang is not None:
+            params = self.localize_params(params, lang)
+        # 所有条件之间为"与"关系, 按给出的顺序求值并短路
+        predicates = [
+            (section, field, queries)
+            for section, section_params in params.items()
+            for field, queries in section_params.items()
+        ]
+        profile = QueryProfile(inst_cat, predicates=[
+            PredicateProfile(section, field, [query.strategy for query in queries]) for section, field, queries in predicates
+        ]) if explain else None
+
+        # 每个ID只出现一次, 结果按数据库中的顺序排列, 无需再用集合去重
+        result = []
         # 遍历该类别下的所有实例
         for inst_id, inst_data in self._data.get(inst_cat, {}).items():
-            for param_section, param_section_data in params.items():
-                for param_field, param_values in param_section_data.items():
-                    if (inst_section_data := inst_data.get(param_section)) is None:
-                        break
-                    if (inst_values := inst_section_data.get(param_field)) is None:
-                        break
-                    is_match = False
-                    for param_value in param_values:
-                        match param_value.strategy:
-                            case QueryStrategy.CONTAINS:
-                                if any(param_value.query.lower() in inst_value.lower() for inst_value in inst_values):
-                                    is_match = True
-                            case QueryStrategy.EQUALS:
-                                if any(param_value.query.lower() == inst_value.lower() for inst_value in inst_values):
-                                    is_match = True
-                            case QueryStrategy.AT_LEAST:
-                                if any(int(param_value.query.lower()) <= int(inst_value) for inst_value in inst_values):
-                                    is_match = True
-                            case QueryStrategy.WITHOUT_UNIT_AT_LEAST:
-                                if any(int(param_value.query.lower()) <= int("".join(filter(lambda x: x.isdigit(), inst_value.split()))) for inst_value in inst_values):
-                                    is_match = True
-                            case QueryStrategy.DISPLAY_RESOLUTION_AT_LEAST:
-                                for inst_value in inst_values:
-                                    # 判断是否为分辨率格式
-                                    try:
-                                        primary_resolution, secondary_resolution = int((k:=inst_value.split("x"))[0]), int(k[1])
-                                        primary_param_resolution, secondary_param_resolution = int((k:=param_value.query.split("x"))[0]), int(k[1])
-                                    except ValueError:
-                                        continue
-                                    if primary_resolution >= primary_param_resolution and secondary_resolution >= secondary_param_resolution:
-                                        is_match = True
-                                        break
-                    if is_match:
-                        continue
-                    # 执行了 break，说明该实例不符合条件
-                    break
-                else:   # 未执行 break，说明该实例符合条件
-                    continue
-                break
+            if profile is None:
+                is_match = all(match_predicate(inst_data, *predicate) for predicate in predicates)
             else:
-                result.add(
-                    Instance(
-                        InstMeta(inst_cat, int(inst_id)),
-                        inst_data
-                    )
-                )
-        return list(result)
+                is_match = self._profile_predicates(inst_data, predicates, profile)
+            if is_match:
+                result.append(Instance.of(InstMeta(inst_cat, int(inst_id)), inst_data))
+        if profile is None:
+            return result
+
+        profile.scanned = len(self._data.get(inst_cat, {}))
+        profile.returned = len(result)
+        profile.elapsed = time.perf_counter() - start
+        return result, profile
+
+    @staticmethod
+    def localize_params(params: dict[str, dict[str, list[Query]]], lang: LangClass) -> dict[str, dict[str, list[Query]]]:
+        """
+        将查询参数中使用译文的分类名与字段名还原为原文
+
+        翻译表是名称表, 其中含有 "RAM" -> "Operative Memory" 这类短译名, 因此不作用于查询值
+        """
+        return {
+            lang.canonical(section): {
+                lang.canonical(field): queries
+                for field, queries in section_params.items()
+            }
+            for section, section_params in params.items()
+        }
+
+    @staticmethod
+    def _profile_predicates(inst_data: dict, predicates: list[tuple[str, str, list[Query]]], profile: QueryProfile) -> bool:
+        for (section, field, queries), predicate_profile in zip(predicates, profile.predicates):
+            start = time.perf_counter()
+            is_match = match_predicate(inst_data, section, field, queries)
+            predicate_profile.elapsed += time.perf_counter() - start
+            predicate_profile.evaluations += 1
+            if not is_match:
+                return False
+            predicate_profile.matches += 1
+        return True
 
 
 class JsonDatabase(MemoryDatabase):
     def __init__(self, filepath: str):
         super().__init__()
         self.filepath = filepath
+        # 抓取信息单独存放, 保持数据文件格式不变
+        self.records_filepath = f"{filepath}.records"
 
     async def load(self):
         if not await aiofiles.ospath.exists(self.filepath):
             self._data = {}
+            self.version += 1
             logger.warning(f"JSON file {self.filepath} not found, skip loading.")
             return
         async with aiofiles.open(self.filepath, "r") as f:
             if (k := await f.read()) == "":
                 self._data = {}
+                self.version += 1
                 logger.warning(f"JSON file {self.filepath} is empty, skip loading.")
                 return
             self._data = ujson.loads(k)
+            self.version += 1
+        if await aiofiles.ospath.exists(self.records_filepath):
+            async with aiofiles.open(self.records_filepath, "r") as f:
+                self._load_records(ujson.loads(await f.read() or "{}"))
 
     async def dump(self):
         async with aiofiles.open(self.filepath, "w") as f:
             await f.write(ujson.dumps(self._data, indent=2))
+        async with aiofiles.open(self.records_filepath, "w") as f:
+            await f.write(ujson.dumps(self._dump_records()))
 
 
 class PickleDatabase(MemoryDatabase):
     def __init__(self, filepath: str):
         super().__init__()
         self.filepath = filepath
+        # 抓取信息单独存放, 保持数据文件格式不变
+        self.records_filepath = f"{filepath}.records"
 
     async def load(self):
         if not await aiofiles.ospath.exists(self.filepath):
             self._data = {}
+            self.version += 1
             logger.warning(f"Pickle file {self.filepath} not found, skip loading.")
             return
         async with aiofiles.open(self.filepath, "rb") as f:
             if (k := await f.read()) == b"":
                 self._data = {}
+                self.version += 1
                 logger.warning(f"Pickle file {self.filepath} is empty, skip loading.")
                 return
             self._data = pickle.loads(k)
+            self.version += 1
+        if await aiofiles.ospath.exists(self.records_filepath):
+            async with aiofiles.open(self.records_filepath, "rb") as f:
+                if k := await f.read():
+                    self._load_records(pickle.loads(k))
 
     async def dump(self):
         async with aiofiles.open(self.filepath, "wb") as f:
             await f.write(pickle.dumps(self._data))
+        async with aiofiles.open(self.records_filepath, "wb") as f:
+            await f.write(pickle.dumps(self._dump_records()))
@@ -0,0 +1,101 @@
+import time
+
+from aiohttp import web
+from loguru import logger
+
+from .replay import FaultInjector, NOT_FOUND_PAGE, PageStore
+
+
+class FakePhoneDBServer:
+    """
+    本地的 PhoneDB 替身服务器, 从 PageStore 提供 index.php 的页面,
+    支持可配置的延迟、错误注入 (503) 与限流 (429), 用于离线基准测试与回归测试
+
+    Example:
+        async with FakePhoneDBServer(SyntheticStore(database), latency=0.01) as server:
+            async with PhoneDBHTTPSession(runner, MemoryDatabase(), base_url=server.base_url) as session:
+                ...
+    """
+
+    def __init__(
+            self,
+            store: PageStore,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            rate_limit: float | None = None,
+            burst: int = 10,
+            seed: int | None = None
+    ):
+        """
+        :param port: 监听端口, 0 表示随机
+        :param latency: 每个请求的固定延迟 (秒)
+        :param jitter: 额外的随机延迟上限 (秒)
+        :param error_rate: 返回 503 的概率
+        :param rate_limit: 每秒允许的请求数, 超出时返回 429; None 表示不限流
+        :param burst: 限流令牌桶的容量
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.faults = FaultInjector(latency, jitter, error_rate, seed)
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.requests = 0
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    def _take_token(self) -> bool:
+        if self.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_limit)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._take_token():
+            return web.Response(status=429, text="Too Many Requests")
+        await self.faults.delay()
+        if self.faults.should_fail():
+            return web.Response(status=503, text="Service Unavailable")
+
+        data = list((await request.post()).items()) if request.method == "POST" else None
+        response = await self.store.lookup(request.method, list(request.query.items()), data)
+        if response is None:
+            return web.Response(status=404, text=NOT_FOUND_PAGE, content_type="text/html")
+        return web.Response(status=response.status_code, body=response.content, content_type="text/html")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/index.php", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Fake PhoneDB server listening on {self.base_url}")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
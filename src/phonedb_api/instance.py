@@ -1,5 +1,10 @@
 import dataclasses
 import enum
+import weakref
+from typing import ClassVar
+
+# 列表/搜索/查询结果每页的条目数
+PAGE_SIZE = 29
 
 
 class InstCat(enum.StrEnum):
@@ -13,24 +18,59 @@ class InstCat(enum.StrEnum):
     MOBILE_OPERATOR = "vendor"
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class InstMeta:
     """
-    实例元数据
+    实例元数据, 不可变且可哈希
     """
     inst_cat: InstCat
     inst_id: int
 
+    @property
+    def key(self) -> int:
+        """
+        :return: 打包的整数键 (类别序号 << 32 | ID), 可用于索引与位图
+        """
+        return _CAT_INDEX[self.inst_cat] << 32 | self.inst_id
+
+    @classmethod
+    def from_key(cls, key: int) -> "InstMeta":
+        return cls(_CATS[key >> 32], key & 0xFFFFFFFF)
+
+
+_CATS = list(InstCat)
+_CAT_INDEX = {inst_cat: index for index, inst_cat in enumerate(_CATS)}
+
+
+@dataclasses.dataclass(frozen=True, slots=True, weakref_slot=True, eq=False, repr=False)
 class Instance:
-    def __init__(self, meta: InstMeta, data: dict):
-        self.meta = meta
-        self.data = data
+    """
+    实例, 不可变; 相等当且仅当元数据相同且数据相同
+    """
+    meta: InstMeta
+    data: dict
 
-    def __str__(self):
-        return f"Instance(inst_cat={self.meta.inst_cat}, inst_id={self.meta.inst_id})"
+    # 享元缓存: 打包键 -> 仍被引用的 Instance
+    _cache: ClassVar[weakref.WeakValueDictionary[int, "Instance"]] = weakref.WeakValueDictionary()
 
-    def __hash__(self):
-        return hash((self.meta.inst_cat, self.meta.inst_id))
+    @classmethod
+    def of(cls, meta: InstMeta, data: dict) -> "Instance":
+        """
+        返回共享的 Instance: 同一实例的数据对象未变化时复用已有对象, 不重复分配
+        """
+        key = meta.key
+        if (instance := cls._cache.get(key)) is not None and instance.data is data:
+            return instance
+        instance = cls._cache[key] = cls(meta, data)
+        return instance
 
+    def __str__(self):
+        return f"Instance(inst_cat={self.meta.inst_cat}, inst_id={self.meta.inst_id})"
 
+    def __eq__(self, other):
+        if not isinstance(other, Instance):
+            return NotImplemented
+        return self.meta == other.meta and (self.data is other.data or self.data == other.data)
 
+    def __hash__(self):
+        return hash(self.meta)
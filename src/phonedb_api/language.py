@@ -1,8 +1,12 @@
+import collections
 import enum
 from abc import ABC, abstractmethod
+from typing import Iterable
 
 from loguru import logger
 
+from .instance import Instance
+
 
 class LangCode(enum.StrEnum):
     EN_US = "en_US"
@@ -18,6 +22,18 @@ class LangClass(ABC):
     语言基类
     """
     _map = {}
+    # 本进程中已经提示过的缺失键 (语言代码, 键), 每个键只提示一次
+    _reported_missing: set[tuple[str, str]] = set()
+
+    def __init__(self, cache_size: int = 10000):
+        """
+        :param cache_size: translate_instance 缓存的已翻译实例数上限
+        """
+        self.cache_size = cache_size
+        # 预编译的键表: 翻译表的副本, 缺失的键在首次遇到时以原文补入, 之后不再走缺失分支
+        self._table: dict[str, str] = dict(self.translations)
+        # 打包键 -> (原始数据, 翻译后的实例), 原始数据对象变化 (如 add_data) 时失效
+        self._views: collections.OrderedDict[int, tuple[dict, Instance]] = collections.OrderedDict()
 
     @property
     @abstractmethod
@@ -34,13 +50,91 @@ class LangClass(ABC):
         """
         return self._map
 
+    @property
+    def reverse_translations(self) -> dict[str, str]:
+        """
+        :return: 反向翻译字典 (译文 -> 原文), 每种语言只构建一次; 多个原文译为同一译文时取第一个
+        """
+        cls = type(self)
+        if (reverse := cls.__dict__.get("_reverse_map")) is None:
+            reverse = {}
+            for key, value in cls._map.items():
+                reverse.setdefault(value, key)
+            cls._reverse_map = reverse
+        return reverse
+
+    def canonical(self, text: str) -> str:
+        """
+        :return: 译文对应的原文 (英文) 名称, 不是译文时原样返回
+        """
+        return self.reverse_translations.get(text, text)
+
     def translate(self, key: str) -> str:
         """获取翻译文本，支持格式化参数"""
-        if key not in self.translations:
+        if (value := self._table.get(key)) is None:
+            return self._missing(key)
+        return value
+
+    def _missing(self, key: str) -> str:
+        if (self.code, key) not in LangClass._reported_missing:
+            LangClass._reported_missing.add((self.code, key))
             logger.warning(f"在语言 {self.code} 中未找到键 {key}")
-            return key
+        self._table[key] = key
+        return key
+
+    def translate_data(self, data: dict) -> dict:
+        """
+        翻译整个实例数据: 分类名与字段名按键表翻译, 值仅在翻译表中存在时替换 (值缺失不提示)
+
+        :return: 新的数据字典, 不修改原数据
+        """
+        table = self._table
+        translations = self.translations
+        result = {}
+        for section, fields in data.items():
+            if (translated_section := table.get(section)) is None:
+                translated_section = self._missing(section)
+            if not isinstance(fields, dict):
+                result[translated_section] = fields
+                continue
+            translated_fields = {}
+            for field, values in fields.items():
+                if (translated_field := table.get(field)) is None:
+                    translated_field = self._missing(field)
+                if isinstance(values, list):
+                    values = [translations.get(value, value) for value in values]
+                translated_fields[translated_field] = values
+            result[translated_section] = translated_fields
+        return result
+
+    def translate_instance(self, instance: Instance) -> Instance:
+        """
+        翻译实例, 结果按 (实例, 语言) 缓存; 数据库中该实例被 add_data 替换后缓存自动失效
+        """
+        key = instance.meta.key
+        if (view := self._views.get(key)) is not None and view[0] is instance.data:
+            self._views.move_to_end(key)
+            return view[1]
+        translated = Instance(instance.meta, self.translate_data(instance.data))
+        self._views[key] = (instance.data, translated)
+        if len(self._views) > self.cache_size:
+            self._views.popitem(last=False)
+        return translated
+
+    def translate_instances(self, instances: Iterable[Instance]) -> list[Instance]:
+        """
+        翻译查询或搜索结果集
+        """
+        return [self.translate_instance(instance) for instance in instances]
+
+    def invalidate(self, instance: Instance | None = None):
+        """
+        丢弃缓存的翻译结果, 未指定实例时清空全部
+        """
+        if instance is None:
+            self._views.clear()
         else:
-            return self.translations[key]
+            self._views.pop(instance.meta.key, None)
 
     def __getitem__(self, key: str) -> str:
         """支持通过下标访问翻译"""
@@ -57,6 +151,12 @@ class LangClassEnUS(LangClass):
     def translate(self, key: str) -> str:
         return key
 
+    def translate_data(self, data: dict) -> dict:
+        return data
+
+    def translate_instance(self, instance: Instance) -> Instance:
+        return instance
+
 class LangClassZhCN(LangClass):
     _map = {
         "Introduction": "介绍",
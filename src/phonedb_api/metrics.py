@@ -0,0 +1,304 @@
+import bisect
+import contextlib
+import dataclasses
+import os
+import time
+from typing import Callable, Iterator
+
+from loguru import logger
+
+# 指标名称
+REQUEST_SECONDS = "request_seconds"
+BACKOFF_SECONDS = "backoff_seconds"
+PARSE_SECONDS = "parse_seconds"
+ADD_DATA_SECONDS = "add_data_seconds"
+QUEUE_WAIT_SECONDS = "queue_wait_seconds"
+REQUESTS = "requests"
+REQUEST_ERRORS = "request_errors"
+RESPONSE_BYTES = "response_bytes"
+RETRIES = "retries"
+COMPLETED = "completed"
+FAILED = "failed"
+IN_FLIGHT_REQUESTS = "in_flight_requests"
+IN_FLIGHT_TASKS = "in_flight_tasks"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+_HELP = {
+    REQUEST_SECONDS: "Latency of a single HTTP attempt",
+    BACKOFF_SECONDS: "Time spent in retry backoff and circuit breaker waits per request",
+    PARSE_SECONDS: "Time spent parsing a detail page",
+    ADD_DATA_SECONDS: "Time spent writing an instance into the database",
+    QUEUE_WAIT_SECONDS: "Time a task waited in the runner before it started",
+    REQUESTS: "HTTP attempts that received a response",
+    REQUEST_ERRORS: "HTTP attempts that raised an exception or received a retryable status (429, 5xx)",
+    RESPONSE_BYTES: "Bytes received in response bodies",
+    RETRIES: "Retried HTTP attempts",
+    COMPLETED: "Tasks completed successfully",
+    FAILED: "Tasks that failed",
+    IN_FLIGHT_REQUESTS: "HTTP attempts currently in flight",
+    IN_FLIGHT_TASKS: "Tasks currently running",
+}
+
+# 钩子: 每次记录指标时以 (指标名称, 值) 调用
+MetricsHook = Callable[[str, float], None]
+
+
+class Histogram:
+    """
+    固定桶的直方图, 与 Prometheus 的 histogram 语义一致
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # 最后一个为 +Inf 桶
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        :return: 分位数的估计值 (所在桶的上界)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class CrawlMetrics:
+    """
+    爬取过程的指标: 请求延迟、退避、解析与写入耗时、执行器排队等待等直方图,
+    以及请求数、字节数、重试数等计数器和进行中的数量
+
+    Example:
+        metrics = CrawlMetrics(export_path="phonedb.prom")
+        metrics.add_hook(lambda name, value: statsd.timing(name, value))
+        session = PhoneDBHTTPSession(runner, database, metrics=metrics)
+    """
+
+    def __init__(self, export_path: str | None = None, hooks: list[MetricsHook] | None = None, prefix: str = "phonedb"):
+        """
+        :param export_path: Prometheus 文本格式的导出文件 (可供 node_exporter textfile collector 读取)
+        :param hooks: 每次记录指标时调用的钩子
+        :param prefix: 导出时指标名称的前缀
+        """
+        self.export_path = export_path
+        self.hooks: list[MetricsHook] = list(hooks or [])
+        self.prefix = prefix
+        self.histograms: dict[str, Histogram] = {
+            REQUEST_SECONDS: Histogram(),
+            BACKOFF_SECONDS: Histogram(),
+            PARSE_SECONDS: Histogram(FAST_BUCKETS),
+            ADD_DATA_SECONDS: Histogram(FAST_BUCKETS),
+            QUEUE_WAIT_SECONDS: Histogram(),
+        }
+        self.counters: dict[str, float] = dict.fromkeys(
+            (REQUESTS, REQUEST_ERRORS, RESPONSE_BYTES, RETRIES, COMPLETED, FAILED), 0
+        )
+        self.gauges: dict[str, float] = dict.fromkeys((IN_FLIGHT_REQUESTS, IN_FLIGHT_TASKS), 0)
+
+    def add_hook(self, hook: MetricsHook):
+        self.hooks.append(hook)
+
+    def _notify(self, name: str, value: float):
+        for hook in self.hooks:
+            hook(name, value)
+
+    def observe(self, name: str, value: float):
+        """
+        向直方图记录一个值, 不存在时以默认桶创建
+        """
+        if (histogram := self.histograms.get(name)) is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+        self._notify(name, value)
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        self._notify(name, value)
+
+    def add(self, name: str, delta: float):
+        """
+        调整计量值 (如进行中的数量)
+        """
+        self.gauges[name] = self.gauges.get(name, 0) + delta
+        self._notify(name, self.gauges[name])
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        记录代码块的耗时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        """
+        代码块执行期间计量值加一
+        """
+        self.add(name, 1)
+        try:
+            yield
+        finally:
+            self.add(name, -1)
+
+    def to_prometheus(self) -> str:
+        """
+        :return: Prometheus 文本格式的全部指标
+        """
+        lines = []
+        for name, histogram in self.histograms.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{full_name}_sum {histogram.sum}")
+            lines.append(f"{full_name}_count {histogram.count}")
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, value in values.items():
+                full_name = f"{self.prefix}_{name}_total" if kind == "counter" else f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """
+        写入 export_path, 未指定时不做任何事
+        """
+        if self.export_path is None:
+            return
+        # 先写临时文件再替换, 避免采集方读到写了一半的文件
+        tmp_filepath = f"{self.export_path}.tmp"
+        with open(tmp_filepath, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_filepath, self.export_path)
+
+    def summary(self) -> dict[str, float]:
+        """
+        :return: 便于日志输出的扁平摘要
+        """
+        result = dict(self.counters) | dict(self.gauges)
+        for name, histogram in self.histograms.items():
+            result[f"{name}_mean"] = histogram.mean
+            result[f"{name}_p95"] = histogram.quantile(0.95)
+        return result
+
+
+@dataclasses.dataclass(slots=True)
+class ProgressSnapshot:
+    done: int
+    failed: int
+    total: int | None
+    elapsed: float
+    rate: float
+    eta: float | None
+    finished: bool = False
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed
+
+
+def log_progress(snapshot: ProgressSnapshot):
+    """
+    默认的进度回调: 结构化字段绑定在日志记录的 extra 中
+    """
+    total = "?" if snapshot.total is None else snapshot.total
+    eta = "?" if snapshot.eta is None else f"{snapshot.eta:.0f}s"
+    logger.bind(progress=dataclasses.asdict(snapshot)).info(
+        f"Progress: {snapshot.processed}/{total}, failed {snapshot.failed}, "
+        f"{snapshot.rate:.1f}/s, ETA {eta}" + (", finished" if snapshot.finished else "")
+    )
+
+
+class ProgressReporter:
+    """
+    限速的吞吐量与剩余时间报告: 每 interval 秒最多回调一次, 速率为指数加权平均
+    """
+
+    def __init__(
+            self,
+            total: int | None = None,
+            metrics: CrawlMetrics | None = None,
+            callback: Callable[[ProgressSnapshot], None] | None = None,
+            interval: float = 5.0,
+            smoothing: float = 0.3
+    ):
+        """
+        :param total: 任务总数, 未知时为 None (不计算剩余时间)
+        :param metrics: 同时累计完成/失败计数, 并在每次报告时导出
+        :param callback: 接收进度快照的回调, 默认写日志
+        :param interval: 报告间隔 (秒)
+        :param smoothing: 新速率样本的权重
+        """
+        self.total = total
+        self.metrics = metrics
+        self.callback = callback or log_progress
+        self.interval = interval
+        self.smoothing = smoothing
+        self.done = 0
+        self.failed = 0
+        self.rate = 0.0
+
+        self._start = self._last_report = time.monotonic()
+        self._last_processed = 0
+
+    def update(self, ok: bool = True):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        if self.metrics is not None:
+            self.metrics.inc(COMPLETED if ok else FAILED)
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+
+    def snapshot(self, finished: bool = False) -> ProgressSnapshot:
+        processed = self.done + self.failed
+        eta = None
+        if self.total is not None and self.rate > 0:
+            eta = max(self.total - processed, 0) / self.rate
+        return ProgressSnapshot(self.done, self.failed, self.total, time.monotonic() - self._start, self.rate, eta, finished)
+
+    def report(self, finished: bool = False):
+        now = time.monotonic()
+        processed = self.done + self.failed
+        if finished:
+            self.rate = processed / (now - self._start) if now > self._start else 0.0
+        elif (elapsed := now - self._last_report) > 0:
+            sample = (processed - self._last_processed) / elapsed
+            self.rate = sample if self._last_processed == 0 else self.smoothing * sample + (1 - self.smoothing) * self.rate
+        self._last_report = now
+        self._last_processed = processed
+        self.callback(self.snapshot(finished))
+        if self.metrics is not None:
+            self.metrics.export()
+
+    def finish(self):
+        self.report(finished=True)
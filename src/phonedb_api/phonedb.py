@@ -1,100 +1,74 @@
 import abc
 import asyncio
+import contextlib
+import dataclasses
 import math
+import time
 import urllib.parse
-from functools import wraps
-from typing import AsyncGenerator, Generator
+from typing import AsyncGenerator, AsyncIterable, Awaitable, Callable, Collection, Generator, Iterable, Sized
 
-import aiohttp
-import curl_cffi
 import lxml.etree
 from loguru import logger
 
+from .cache import WebsiteCache
+from .checkpoint import CrawlCheckpoint
 from .database import AbstractDatabase
-from .instance import InstMeta, InstCat, Instance
+from .instance import InstMeta, InstCat, Instance, PAGE_SIZE
+from .language import LangClass
+from .metrics import (
+    ADD_DATA_SECONDS, BACKOFF_SECONDS, IN_FLIGHT_REQUESTS, IN_FLIGHT_TASKS, PARSE_SECONDS, QUEUE_WAIT_SECONDS,
+    REQUEST_ERRORS, REQUEST_SECONDS, REQUESTS, RESPONSE_BYTES, RETRIES,
+    CrawlMetrics, ProgressReporter, ProgressSnapshot
+)
 from .parse import QueryFormParser, InstanceParser
-from .runner import AbstractAsyncRunner
+from .profiling import SessionProfiler
+from .runner import AbstractAsyncRunner, AsyncParallelRunner, Lane, TaskResult
+from .replay import RecordingStore, RecordingTransport, ReplayTransport
+from .retry import RetryPolicy
+from .transport import AbstractTransport, CurlCffiTransport, TransportResponse
 
 
-def sync_retry(max_attempts=3, initial_wait=1, max_wait=10):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            retry_count = 0
-            last_exception = None
+# 预编译的 XPath
+_LATEST_ID_XPATH = lxml.etree.XPath("/html/body/div[5]/div[1]/div[1]/a/@href")
+_SEARCH_COUNT_XPATH = lxml.etree.XPath("/html/body/div[4]/text()[1]")
+_SEARCH_ENTRY_XPATH = lxml.etree.XPath("/html/body/div[5]/div[not(@style)]/*[1]/*[1]/@href")
+_QUERY_COUNT_XPATH = lxml.etree.XPath("/html/body/div[5]/form/div[2]/text()[1]")
+_QUERY_ENTRY_XPATH = lxml.etree.XPath(
+    "/html/body/div[5]/form/div[@class='content_block' and not(@style)]"
+    "[*[1][@class='content_block_title']]/*[1]/*[1]/@href"
+)
 
-            while retry_count < max_attempts:
-                try:
-                    return func(*args, **kwargs)
-                except (
-                        curl_cffi.CurlError,
-                        aiohttp.ClientError,
-                        ConnectionError,
-                        OSError
-                ) as e:
-                    logger.error(f"Request failed (attempt {retry_count + 1}/{max_attempts}): {e}")
-                    last_exception = e
-                    retry_count += 1
 
-                    if retry_count >= max_attempts:
-                        break
+def _parse_id(href: str) -> int:
+    return int(urllib.parse.parse_qs(urllib.parse.urlparse(href).query)["id"][0])
 
-                    # 指数退避策略
-                    wait_time = min(initial_wait * (2 ** (retry_count - 1)), max_wait)
-                    asyncio.sleep(wait_time)
 
-            # 如果所有重试都失败了，抛出最后一个异常
-            raise last_exception or Exception("Unknown error occurred during retry")
-
-        return wrapper
-
-    return decorator
-
-
-# Solana saga
-def async_retry(max_attempts=3, initial_wait=1, max_wait=10):
+def _parse_count(texts: list[str]) -> int:
     """
-    异步重试装饰器
+    解析 "N results" 形式的结果数, 页面明确显示无结果时为 0
 
-    Args:
-        max_attempts: 最大重试次数
-        initial_wait: 初始等待时间（秒）
-        max_wait: 最大等待时间（秒）
+    :raise ValueError: 找不到或无法解析结果数 (页面结构变化), 避免将其当作无结果并写入缓存
     """
-
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            retry_count = 0
-            last_exception = None
-
-            while retry_count < max_attempts:
-                try:
-                    return await func(*args, **kwargs)
-                except (
-                        curl_cffi.CurlError,
-                        aiohttp.ClientError,
-                        asyncio.TimeoutError,
-                        ConnectionError,
-                        OSError
-                ) as e:
-                    logger.error(f"Request failed (attempt {retry_count + 1}/{max_attempts}): {e}")
-                    last_exception = e
-                    retry_count += 1
-
-                    if retry_count >= max_attempts:
-                        break
-
-                    # 指数退避策略
-                    wait_time = min(initial_wait * (2 ** (retry_count - 1)), max_wait)
-                    await asyncio.sleep(wait_time)
-
-            # 如果所有重试都失败了，抛出最后一个异常
-            raise last_exception or Exception("Unknown error occurred during retry")
-
-        return wrapper
-
-    return decorator
+    if not texts:
+        raise ValueError("Result count not found in the page")
+    if "no content" in texts[0].lower():
+        return 0
+    count = texts[0].split(" ")[0]
+    if not count.isdigit():
+        raise ValueError(f"Unrecognized result count {texts[0]!r}")
+    return int(count)
+
+
+@dataclasses.dataclass(slots=True)
+class SyncResult:
+    """
+    单个类别的增量同步结果
+    """
+    inst_cat: InstCat
+    previous_id: int
+    latest_id: int
+    added: list[int] = dataclasses.field(default_factory=list)
+    failed: list[int] = dataclasses.field(default_factory=list)
 
 
 class AbstractPhoneDBSession(abc.ABC):
@@ -105,6 +79,13 @@ class AbstractPhoneDBSession(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def discover_ids(self, inst_cat: InstCat) -> Generator[InstMeta]:
+        """
+        获取所有存在的实例ID
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_data(self, inst_meta: InstMeta) -> Instance:
         """
@@ -148,179 +129,540 @@ class PhoneDBHTTPSession(AbstractPhoneDBSession):
             self,
             runner: AbstractAsyncRunner,
             database: AbstractDatabase,
+            transport: AbstractTransport | None = None,
+            base_url: str = BASE_URL,
+            retry_policy: RetryPolicy | None = None,
+            page_runner: AbstractAsyncRunner | None = None,
+            website_cache: WebsiteCache | None = None,
+            replay_dir: str | None = None,
+            record_dir: str | None = None,
+            metrics: CrawlMetrics | None = None,
+            progress_callback: Callable[[ProgressSnapshot], None] | None = None,
+            progress_interval: float = 5.0,
+            profiler: SessionProfiler | None = None,
             **kwargs
     ):
+        """
+        :param transport: 传输层, 默认为 CurlCffiTransport(**kwargs); 可替换为本地替身
+        :param base_url: 站点地址
+        :param retry_policy: 每个请求 (包括分页请求) 的重试策略, 默认为 RetryPolicy()
+        :param page_runner: 结果分页专用的执行器, 与 runner 互不干扰, 默认为 AsyncParallelRunner(8)
+        :param website_cache: search_website / query_website 的结果缓存, 为 None 时不缓存
+        :param replay_dir: 从该目录回放录制的页面, 不访问网络 (替代 transport)
+        :param record_dir: 将所有响应录制到该目录, 供之后回放
+        :param metrics: 请求、解析、写入与排队等待的指标, 默认新建一个 (不导出)
+        :param progress_callback: 批量抓取时接收进度快照的回调, 默认写日志
+        :param progress_interval: 批量抓取时报告进度的间隔 (秒)
+        :param profiler: 对 get_data_multi、load、dump、query_data 进行 CPU 与内存剖析;
+                         未指定时由环境变量 PHONEDB_PROFILE 决定是否启用
+        :param kwargs: 未指定 transport 时传递给 CurlCffiTransport
+        """
         self.runner = runner
         self.database = database
-
-        self.curl_cffi_session = curl_cffi.AsyncSession(**kwargs)
-        self.aiohttp_session = aiohttp.ClientSession()
+        if replay_dir is not None:
+            transport = ReplayTransport(RecordingStore(replay_dir))
+        self.transport = transport or CurlCffiTransport(**kwargs)
+        if record_dir is not None:
+            self.transport = RecordingTransport(self.transport, RecordingStore(record_dir))
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.page_runner = page_runner or AsyncParallelRunner(max_workers=8)
+        self.website_cache = website_cache
+        self._index_url = urllib.parse.urljoin(base_url, "index.php")
+        self.metrics = metrics or CrawlMetrics()
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.profiler = profiler or SessionProfiler.from_env()
+
+        # 进行中的实例请求, 键为 (inst_cat, inst_id)
+        self._inflight: dict[tuple[InstCat, int], asyncio.Future] = {}
+        # 各进行中的请求的等待方数量
+        self._waiters: dict[asyncio.Future, int] = {}
+        # 因合并并发请求而节省的请求数
+        self.coalesced_requests = 0
 
     async def __aenter__(self):
-        await self.database.load()
+        async with self._profile("load"):
+            await self.database.load()
+        if self.website_cache is not None:
+            await self.website_cache.load()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.curl_cffi_session.close()
-        await self.aiohttp_session.close()
-        await self.database.dump()
+        await self.transport.close()
+        async with self._profile("dump"):
+            await self.database.dump()
+        if self.website_cache is not None:
+            await self.website_cache.dump()
+        self.metrics.export()
+
+    def _profile(self, operation: str) -> contextlib.AbstractAsyncContextManager:
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.profile(operation, self.database)
+
+    async def _request(self, method: str, params: dict, data: dict | None = None) -> TransportResponse:
+        """
+        按重试策略向 index.php 发送请求, 并记录每次尝试的延迟与退避等待时间
+        """
+        metrics = self.metrics
+        attempts = 0
+        attempt_time = 0.0
+
+        async def attempt() -> TransportResponse:
+            nonlocal attempts, attempt_time
+            attempts += 1
+            start = time.perf_counter()
+            try:
+                with metrics.track(IN_FLIGHT_REQUESTS):
+                    response = await self.transport.request(method, self._index_url, params=params, data=data)
+            except BaseException:
+                metrics.inc(REQUEST_ERRORS)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                attempt_time += elapsed
+                metrics.observe(REQUEST_SECONDS, elapsed)
+            metrics.inc(REQUESTS)
+            metrics.inc(RESPONSE_BYTES, len(response.content))
+            # 429、5xx 等状态码由重试策略在之后转为 HTTPStatusError, 在此一并计为错误
+            if response.status_code in self.retry_policy.retry_on_status:
+                metrics.inc(REQUEST_ERRORS)
+            return response
+
+        start = time.perf_counter()
+        try:
+            return await self.retry_policy.call(attempt)
+        finally:
+            if attempts > 1:
+                metrics.inc(RETRIES, attempts - 1)
+            # 总耗时中不属于请求本身的部分即为退避与熔断等待
+            metrics.observe(BACKOFF_SECONDS, max(time.perf_counter() - start - attempt_time, 0.0))
 
-    @async_retry(max_attempts=8, initial_wait=1, max_wait=10)
     async def get_latest_id(self, inst_cat: InstCat) -> int:
-        response = await self.curl_cffi_session.get(
-            "https://phonedb.net/index.php",
+        response = await self._request(
+            "GET",
             params={
                 "m": inst_cat,
                 "s": "list"
             }
         )
 
-        tree = lxml.etree.HTML(response.text)
-        href = tree.xpath("/html/body/div[5]/div[1]/div[1]/a")[0].get("href")
-        parsed_url = urllib.parse.urlparse(href)
-        query = urllib.parse.parse_qs(parsed_url.query)
-        return int(query["id"][0])
-
-    @async_retry(max_attempts=8, initial_wait=1, max_wait=10)
-    async def get_data(self, inst_meta: InstMeta) -> Instance:
-        if inst_meta not in self.database:
-            # logger.debug(f"No {inst_meta}")
-            response = await self.curl_cffi_session.get(
-                f"https://phonedb.net/index.php",
-                params={
-                    "m": inst_meta.inst_cat,
-                    "id": inst_meta.inst_id,
-                    "d": "detailed_specs"
-                }
-            )
-            self.database.add_data(inst_meta, (await InstanceParser(inst_meta, response.text).parse()).data)
-        return Instance(inst_meta, self.database.get_data(inst_meta))
-
-    async def get_data_multi(self, inst_metas: list[InstMeta]) -> AsyncGenerator[Instance]:
-        for inst_meta in inst_metas:
-            self.runner.register(
-                self.get_data(inst_meta)
-            )
-        logger.debug(f"Register {len(inst_metas)} tasks.")
-        count = 0
-        async for data in self.runner.run():
-            yield data
-            count += 1
-            logger.debug(f"Progress: {count}/{len(inst_metas)}")
+        return _parse_id(_LATEST_ID_XPATH(lxml.etree.HTML(response.text))[0])
 
-    @sync_retry(max_attempts=8, initial_wait=1, max_wait=10)
-    async def search_website(self, query: str, inst_cat: InstCat) -> AsyncGenerator[InstMeta]:
-        # 为初始请求添加重试
-        response = await self.curl_cffi_session.post(
-            f"https://phonedb.net/index.php",
-            params={
-                "m": inst_cat,
-                "s": "list"
-            },
-            data={
-                "search_exp": query,
-                "search_header": "",
-            }
-        )
-
-        tree = lxml.etree.HTML(response.text)
-        results_count = int(tree.xpath("/html/body/div[4]/text()[1]")[0].split(" ")[0])
-
-        # Do-While
-        for i in range(1, math.ceil(results_count / 29)):
-            filter_arg = i * 29
-            # 为分页请求添加重试
-            self.runner.register(self.curl_cffi_session.post(
-                f"https://phonedb.net/index.php",
-                params={
-                    "m": inst_cat,
-                    "s": "list",
-                    "filter": filter_arg
-                },
-                data={
-                    "search_exp": query,
-                    "search_header": "",
-                }
-            ))
-
-
-        async for response in self.runner.run():
-            tree = lxml.etree.HTML(response.text)
-            for j in tree.xpath("/html/body/div[5]")[0].getchildren():
-                if j.tag != "div" or j.get("style"):
-                    continue
-                yield InstMeta(
-                    inst_cat=inst_cat,
-                    inst_id=int(urllib.parse.parse_qs(
-                        urllib.parse.urlparse(j.getchildren()[0].getchildren()[0].get("href")).query
-                    )["id"][0])
-                )
-
-    async def search_database(self, query: str, inst_cat: InstCat) -> AsyncGenerator[Instance]:
-        for inst_id, data in self.database.search_data(inst_cat, query):
-            yield Instance(InstMeta(inst_cat, inst_id), data)
-
-    @sync_retry(max_attempts=8, initial_wait=1, max_wait=10)
-    async def query_website(self, inst_cat: InstCat, params: dict) -> AsyncGenerator[InstMeta]:
-        # 为初始请求添加重试
-        response = await self.curl_cffi_session.get(
-            f"https://phonedb.net/index.php",
+    async def get_data(self, inst_meta: InstMeta, refresh: bool = False, lane: Lane | None = None) -> Instance:
+        """
+        :param refresh: 为 True 时忽略缓存, 重新抓取
+        :param lane: 直接调用时, 需要请求网络则经由执行器在该通道排队 (例如 Lane.INTERACTIVE);
+                     经由 get_data_multi 等已在执行器中运行时不应指定
+        """
+        if refresh or inst_meta not in self.database:
+            key = (inst_meta.inst_cat, inst_meta.inst_id)
+            # 同一实例的并发请求共享同一次请求与解析
+            if (task := self._inflight.get(key)) is None:
+                fetch = self._fetch_data(inst_meta)
+                task = asyncio.ensure_future(fetch if lane is None else self.runner.submit(fetch, lane))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.coalesced_requests += 1
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+            try:
+                # shield: 单个调用方被取消时不影响其他共享该请求的调用方
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # 最后一个调用方被取消 (如执行器超时或停止消费) 时取消请求本身, 不再重试与写入数据库
+                if self._waiters[task] == 1:
+                    task.cancel()
+                raise
+            finally:
+                if (waiters := self._waiters.pop(task) - 1) > 0:
+                    self._waiters[task] = waiters
+        return Instance.of(inst_meta, self.database.get_data(inst_meta))
+
+    async def _fetch_data(self, inst_meta: InstMeta):
+        # logger.debug(f"No {inst_meta}")
+        response = await self._request(
+            "GET",
             params={
-                "m": inst_cat,
-                "s": "query",
+                "m": inst_meta.inst_cat,
+                "id": inst_meta.inst_id,
                 "d": "detailed_specs"
             }
         )
+        with self.metrics.timer(PARSE_SECONDS):
+            instance = await InstanceParser(inst_meta, response.text).parse()
+        with self.metrics.timer(ADD_DATA_SECONDS):
+            self.database.add_data(inst_meta, instance.data)
 
-        payload = await QueryFormParser(response.text).parse(params)
-        # 为POST请求添加重试
-        response = await self.aiohttp_session.post(
-            f"https://phonedb.net/index.php",
-            params={
-                "m": inst_cat,
-                "s": "query",
-                "d": "detailed_specs"
-            },
-            data=payload
+    async def _queued(self, inst_meta: InstMeta, enqueued_at: float) -> Instance:
+        """
+        由批量接口提交给执行器的任务: 记录从提交到开始执行的排队时间与进行中的任务数
+
+        :param enqueued_at: 提交时的 time.perf_counter(); 协程体在执行器真正调度 (如 AsyncFairRunner 分配到槽位) 后才开始执行
+        """
+        self.metrics.observe(QUEUE_WAIT_SECONDS, time.perf_counter() - enqueued_at)
+        with self.metrics.track(IN_FLIGHT_TASKS):
+            return await self.get_data(inst_meta)
+
+    def _progress(self, total: int | None) -> ProgressReporter:
+        return ProgressReporter(total, self.metrics, self.progress_callback, self.progress_interval)
+
+    async def get_data_multi(
+            self,
+            inst_metas: list[InstMeta],
+            return_exceptions: bool = False,
+            checkpoint: CrawlCheckpoint | None = None,
+            lane: Lane | None = None
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        批量获取实例数据
+
+        :param return_exceptions: 为 True 时产出以 InstMeta 为键的 TaskResult, 单个 ID 失败不会中断整个爬取
+        :param checkpoint: 爬取进度文件; 指定时失败的 ID 被记录而不会中断爬取
+        :param lane: 执行器调度通道, 仅对 AsyncFairRunner 生效
+        """
+        async with self._profile("get_data_multi"):
+            for inst_meta in inst_metas:
+                self.runner.register(self._queued(inst_meta, time.perf_counter()), key=inst_meta)
+                if checkpoint is not None:
+                    checkpoint.mark_pending(inst_meta)
+            if checkpoint is not None:
+                # 立即写入全部待抓取的ID, 第一次定期写入前中断也能完整恢复
+                await checkpoint.flush(force=True)
+            logger.debug(f"Register {len(inst_metas)} tasks.")
+            progress = self._progress(len(inst_metas))
+            results = self.runner.run(return_exceptions or checkpoint is not None, lane)
+            if checkpoint is not None:
+                results = self._checkpointed(results, checkpoint, return_exceptions, progress)
+            async for data in results:
+                yield data
+                if checkpoint is None:
+                    progress.update(not isinstance(data, TaskResult) or data.ok)
+            progress.finish()
+
+    async def get_data_stream(
+            self,
+            inst_metas: Iterable[InstMeta] | AsyncIterable[InstMeta],
+            return_exceptions: bool = False,
+            checkpoint: CrawlCheckpoint | None = None,
+            lane: Lane | None = None
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        流式获取实例数据, 从任意可迭代对象或异步可迭代对象中惰性拉取 InstMeta,
+        同时在执行的任务数不超过执行器的并发上限, 内存占用与总数量无关
+
+        :param return_exceptions: 为 True 时产出以 InstMeta 为键的 TaskResult
+        :param checkpoint: 爬取进度文件; 指定时失败的 ID 被记录而不会中断爬取。
+                           inst_metas 须为列表等集合, 开始前全部记为待抓取, 否则中断后尚未拉取的ID无法恢复
+        :param lane: 执行器调度通道, 仅对 AsyncFairRunner 生效
+        :raise TypeError: 指定 checkpoint 时 inst_metas 为生成器等惰性数据源
+        """
+        if checkpoint is not None:
+            if not isinstance(inst_metas, Collection):
+                raise TypeError("checkpoint requires a collection of InstMeta, lazy sources cannot be resumed")
+            for inst_meta in inst_metas:
+                checkpoint.mark_pending(inst_meta)
+            await checkpoint.flush(force=True)
+
+        def submit(inst_meta: InstMeta):
+            return inst_meta, self._queued(inst_meta, time.perf_counter())
+
+        if isinstance(inst_metas, AsyncIterable):
+            async def source():
+                async for inst_meta in inst_metas:
+                    yield submit(inst_meta)
+        else:
+            def source():
+                for inst_meta in inst_metas:
+                    yield submit(inst_meta)
+
+        progress = self._progress(len(inst_metas) if isinstance(inst_metas, Sized) else None)
+        results = self.runner.stream(source(), return_exceptions or checkpoint is not None, lane)
+        if checkpoint is not None:
+            results = self._checkpointed(results, checkpoint, return_exceptions, progress)
+        async for data in results:
+            yield data
+            if checkpoint is None:
+                progress.update(not isinstance(data, TaskResult) or data.ok)
+        progress.finish()
+
+    async def _checkpointed(
+            self,
+            results: AsyncGenerator[TaskResult],
+            checkpoint: CrawlCheckpoint,
+            return_exceptions: bool,
+            progress: ProgressReporter
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        将结果记录到进度文件; return_exceptions 为 False 时只产出成功的实例
+
+        定期写入进度文件前先写入数据库, 使进度文件中已完成的ID在数据库文件中也已存在
+        """
+        try:
+            async for task_result in results:
+                progress.update(task_result.ok)
+                if task_result.ok:
+                    checkpoint.mark_completed(task_result.key)
+                else:
+                    logger.error(f"{task_result.key} failed: {task_result.exception!r}")
+                    checkpoint.mark_failed(task_result.key)
+                if checkpoint.due():
+                    async with self._profile("dump"):
+                        await self.database.dump()
+                    await checkpoint.flush(force=True)
+                if return_exceptions:
+                    yield task_result
+                elif task_result.ok:
+                    yield task_result.value
+        finally:
+            await checkpoint.flush(force=True)
+
+    async def resume(self, filepath: str, max_failures: int | None = None) -> AsyncGenerator[Instance]:
+        """
+        从进度文件恢复中断的爬取: 先抓取未完成的ID, 再按失败次数升序重试失败过的ID;
+        已完成但数据未写入数据库文件 (进程在写入前退出) 的ID也会重新抓取
+
+        :param filepath: 进度文件路径
+        :param max_failures: 失败次数达到该值的ID不再重试
+        """
+        checkpoint = CrawlCheckpoint(filepath)
+        await checkpoint.load()
+        lost = checkpoint.lost(self.database)
+        remaining = checkpoint.remaining(max_failures) + lost
+        logger.info(
+            f"Resume crawl from {filepath}: {len(remaining)} remaining, "
+            f"{len(checkpoint.completed) - len(lost)} completed, {len(lost)} lost."
         )
+        async for instance in self.get_data_multi(remaining, checkpoint=checkpoint):
+            yield instance
 
-        tree = lxml.etree.HTML(await response.text())
-        text = tree.xpath("/html/body/div[5]/form/div[2]/text()[1]")[0]
-        if "no content" in text.lower():
+    async def search_website(self, query: str, inst_cat: InstCat) -> AsyncGenerator[InstMeta]:
+        params = {
+            "m": inst_cat,
+            "s": "list"
+        }
+        data = {
+            "search_exp": query,
+            "search_header": "",
+        }
+        async for inst_meta in self._iter_listing(
+                inst_cat,
+                WebsiteCache.make_key(inst_cat, "search", query),
+                lambda: self._request("POST", params=params, data=data),
+                lambda offset: self._request("POST", params=params | {"filter": offset}, data=data),
+                _SEARCH_COUNT_XPATH,
+                _SEARCH_ENTRY_XPATH
+        ):
+            yield inst_meta
+
+    async def discover_ids(self, inst_cat: InstCat) -> AsyncGenerator[InstMeta]:
+        """
+        遍历类别的列表页 (每页 PAGE_SIZE 项), 获取所有存在的实例ID, 从新到旧产出
+
+        与按 1 ~ get_latest_id 逐个请求相比, 不会为已删除的ID请求 404 详情页; 列表页结果按网站结果缓存复用
+        """
+        params = {
+            "m": inst_cat,
+            "s": "list"
+        }
+        async for inst_meta in self._iter_listing(
+                inst_cat,
+                WebsiteCache.make_key(inst_cat, "list", ""),
+                lambda: self._request("GET", params=params),
+                lambda offset: self._request("GET", params=params | {"filter": offset}),
+                _SEARCH_COUNT_XPATH,
+                _SEARCH_ENTRY_XPATH
+        ):
+            yield inst_meta
+
+    async def _iter_listing(
+            self,
+            inst_cat: InstCat,
+            cache_key: str,
+            fetch_first_page: Callable[[], Awaitable[TransportResponse]],
+            fetch_page: Callable[[int], Awaitable[TransportResponse]],
+            count_xpath: lxml.etree.XPath,
+            entry_xpath: lxml.etree.XPath
+    ) -> AsyncGenerator[InstMeta]:
+        """
+        遍历分页的结果列表, 并读写网站结果缓存
+
+        :param fetch_first_page: 请求第一页
+        :param fetch_page: 以结果偏移量请求后续分页
+        """
+        cache = self.website_cache
+        entry = cache.get(cache_key) if cache is not None else None
+        if entry is not None and cache.is_fresh(entry) and not cache.revalidate:
+            for inst_id in entry.ids:
+                yield InstMeta(inst_cat, inst_id)
             return
-        results_count = int(text.split(" ")[0])
-
-        for i in range(1, math.ceil(results_count / 29)):
-            filter_arg = i * 29
-            # 为分页请求添加重试
-            self.runner.register(self.aiohttp_session.post(
-                f"https://phonedb.net/index.php",
-                params={
-                    "m": inst_cat,
-                    "s": "query",
-                    "d": "detailed_specs"
-                },
-                data=payload | dict(result_lower_limit=str(filter_arg))
-            ))
-
-
-        async for response in self.runner.run():
-            tree = lxml.etree.HTML(await response.text())
-            for div in tree.xpath("/html/body/div[5]/form")[0].getchildren():
-                if (
-                        div.tag != "div"
-                        or div.get("style")
-                        or div.get("class") != "content_block"
-                        or div.getchildren()[0].get("class") != "content_block_title"
-                ):
-                    continue
-                yield InstMeta(
-                    inst_cat=inst_cat,
-                    inst_id=int(urllib.parse.parse_qs(
-                        urllib.parse.urlparse(div.getchildren()[0].getchildren()[0].get("href")).query
-                    )["id"][0])
-                )
-
-    async def query_database(self, inst_cat: InstCat, params: dict) -> AsyncGenerator[Instance]:
-        for instance in self.database.query_data(inst_cat, params):
+
+        tree = lxml.etree.HTML((await fetch_first_page()).text)
+        results_count = _parse_count(count_xpath(tree))
+        # revalidate 时结果数未变化, 视为缓存仍然有效; 否则过期的缓存总是重新完整遍历
+        if entry is not None and cache.revalidate and entry.count == results_count:
+            cache.touch(cache_key)
+            for inst_id in entry.ids:
+                yield InstMeta(inst_cat, inst_id)
+            return
+
+        inst_ids = []
+        if results_count > 0:
+            # 第一页的结果直接产出, 无需再次请求
+            for href in entry_xpath(tree):
+                inst_ids.append(inst_id := _parse_id(href))
+                yield InstMeta(inst_cat, inst_id)
+
+            # 其余分页交给专用执行器并发请求
+            pages = (fetch_page(i * PAGE_SIZE) for i in range(1, math.ceil(results_count / PAGE_SIZE)))
+            async for response in self.page_runner.stream(pages):
+                for href in entry_xpath(lxml.etree.HTML(response.text)):
+                    inst_ids.append(inst_id := _parse_id(href))
+                    yield InstMeta(inst_cat, inst_id)
+
+        # 仅在完整遍历后写入缓存
+        if cache is not None:
+            cache.set(cache_key, results_count, inst_ids)
+
+    async def sync(self, inst_cats: Iterable[InstCat] = InstCat) -> dict[InstCat, SyncResult]:
+        """
+        增量同步: 并发获取各类别的最新ID, 仅抓取数据库中最大ID之后的新实例
+
+        :param inst_cats: 需要同步的类别, 默认为全部类别
+        :return: 各类别的同步结果
+        """
+        inst_cats = list(inst_cats)
+        latest_ids = await asyncio.gather(*(self.get_latest_id(inst_cat) for inst_cat in inst_cats))
+        results = {
+            inst_cat: SyncResult(inst_cat, self.database.max_id(inst_cat), latest_id)
+            for inst_cat, latest_id in zip(inst_cats, latest_ids)
+        }
+
+        def new_metas():
+            for result in results.values():
+                for inst_id in range(result.previous_id + 1, result.latest_id + 1):
+                    yield InstMeta(result.inst_cat, inst_id)
+
+        async for task_result in self.get_data_stream(new_metas(), return_exceptions=True, lane=Lane.SYNC):
+            result = results[task_result.key.inst_cat]
+            if task_result.ok:
+                result.added.append(task_result.key.inst_id)
+            else:
+                logger.error(f"Sync {task_result.key} failed: {task_result.exception!r}")
+                result.failed.append(task_result.key.inst_id)
+
+        for result in results.values():
+            logger.info(
+                f"Sync {result.inst_cat}: {result.previous_id} -> {result.latest_id}, "
+                f"added {len(result.added)}, failed {len(result.failed)}"
+            )
+        return results
+
+    async def crawl_discovered(
+            self,
+            inst_cats: Iterable[InstCat] = InstCat,
+            include_cached: bool = True,
+            return_exceptions: bool = False,
+            checkpoint: CrawlCheckpoint | None = None
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        完整爬取: 先经由列表页收集各类别存在的实例ID, 再只抓取这些ID的详情页
+
+        遍历期间网站新增实例会使列表分页错位, 同一ID可能出现在相邻两页, 因此先去重再统一提交
+
+        :param include_cached: 为 False 时跳过数据库中已有的实例; 否则直接从数据库产出, 不发请求
+        :param return_exceptions: 为 True 时产出以 InstMeta 为键的 TaskResult
+        :param checkpoint: 爬取进度文件; 指定时失败的ID被记录而不会中断爬取
+        """
+        inst_metas: set[InstMeta] = set()
+        for inst_cat in inst_cats:
+            discovered = [inst_meta async for inst_meta in self.discover_ids(inst_cat)]
+            inst_metas.update(discovered)
+            logger.info(f"Discovered {len(set(discovered))} {inst_cat} instances.")
+
+        pending = sorted(
+            (inst_meta for inst_meta in inst_metas if include_cached or inst_meta not in self.database),
+            key=lambda inst_meta: inst_meta.key
+        )
+        async for data in self.get_data_multi(pending, return_exceptions, checkpoint):
+            yield data
+
+    async def search_database(self, query: str, inst_cat: InstCat, lang: LangClass | None = None) -> AsyncGenerator[Instance]:
+        """
+        :param lang: 指定时同时匹配值的译文
+        """
+        for inst_id, data in self.database.search_data(inst_cat, query, lang=lang):
+            yield Instance.of(InstMeta(inst_cat, inst_id), data)
+
+    async def query_website(self, inst_cat: InstCat, params: dict) -> AsyncGenerator[InstMeta]:
+        request_params = {
+            "m": inst_cat,
+            "s": "query",
+            "d": "detailed_specs"
+        }
+        payload = {}
+
+        async def fetch_first_page() -> TransportResponse:
+            nonlocal payload
+            response = await self._request("GET", params=request_params)
+            payload = await QueryFormParser(response.text).parse(params)
+            # 提交表单的响应即为第一页
+            return await self._request("POST", params=request_params, data=payload)
+
+        async for inst_meta in self._iter_listing(
+                inst_cat,
+                WebsiteCache.make_key(inst_cat, "query", params),
+                fetch_first_page,
+                lambda offset: self._request(
+                    "POST", params=request_params, data=payload | dict(result_lower_limit=str(offset))
+                ),
+                _QUERY_COUNT_XPATH,
+                _QUERY_ENTRY_XPATH
+        ):
+            yield inst_meta
+
+    async def search_and_fetch(
+            self,
+            query: str,
+            inst_cat: InstCat,
+            include_cached: bool = True,
+            return_exceptions: bool = False
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        流水线式的搜索并获取: 每解析完一页搜索结果, 其中的实例立即进入详情抓取, 无需等待全部结果页
+
+        :param include_cached: 为 False 时跳过数据库中已有的实例; 否则直接从数据库产出, 不发请求
+        """
+        source = self.search_website(query, inst_cat)
+        async for data in self.get_data_stream(self._filter_cached(source, include_cached), return_exceptions):
+            yield data
+
+    async def query_and_fetch(
+            self,
+            inst_cat: InstCat,
+            params: dict,
+            include_cached: bool = True,
+            return_exceptions: bool = False
+    ) -> AsyncGenerator[Instance | TaskResult]:
+        """
+        流水线式的查询并获取: 每解析完一页查询结果, 其中的实例立即进入详情抓取, 无需等待全部结果页
+
+        :param include_cached: 为 False 时跳过数据库中已有的实例; 否则直接从数据库产出, 不发请求
+        """
+        source = self.query_website(inst_cat, params)
+        async for data in self.get_data_stream(self._filter_cached(source, include_cached), return_exceptions):
+            yield data
+
+    async def _filter_cached(self, inst_metas: AsyncIterable[InstMeta], include_cached: bool) -> AsyncGenerator[InstMeta]:
+        async for inst_meta in inst_metas:
+            if include_cached or inst_meta not in self.database:
+                yield inst_meta
+
+    async def query_database(self, inst_cat: InstCat, params: dict, lang: LangClass | None = None) -> AsyncGenerator[Instance]:
+        """
+        :param lang: 指定时 params 可以使用该语言的分类名与字段名
+        """
+        async with self._profile("query_data"):
+            instances = self.database.query_data(inst_cat, params, lang=lang)
+        for instance in instances:
             yield instance
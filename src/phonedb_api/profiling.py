@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+from typing import AsyncIterator
+
+import aiofiles
+from loguru import logger
+
+from .database import AbstractDatabase
+
+PROFILE_ENV = "PHONEDB_PROFILE"
+
+
+def deep_sizeof(obj, seen: set[int] | None = None) -> int:
+    """
+    :return: 对象及其包含的字典、列表等的总大小 (字节), seen 中已计入的对象不重复计算
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+    return size
+
+
+def database_memory(database: AbstractDatabase) -> dict[str, tuple[int, int]]:
+    """
+    :return: 各类别的 (实例数, 占用字节数)
+    """
+    seen = set()
+    return {
+        str(inst_cat): (len(instances), deep_sizeof(instances, seen))
+        for inst_cat, instances in database.get_all_data().items()
+    }
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class SessionProfiler:
+    """
+    会话操作的 CPU (cProfile) 与内存 (tracemalloc) 剖析, 每次操作写出一份报告
+
+    通过 PhoneDBHTTPSession(profiler=...) 或环境变量 PHONEDB_PROFILE 启用:
+        PHONEDB_PROFILE=1                    输出到 ./phonedb_profiles
+        PHONEDB_PROFILE=/tmp/profiles        输出到指定目录
+
+    cProfile 剖析的是整个线程, 并发执行的其他操作与异步生成器的消费方也会计入;
+    同一时刻只有最外层的操作启用 cProfile
+    """
+
+    def __init__(
+            self,
+            output_dir: str = "phonedb_profiles",
+            cpu: bool = True,
+            memory: bool = True,
+            snapshot_interval: float | None = None,
+            top: int = 25,
+            frames: int = 1
+    ):
+        """
+        :param output_dir: 报告输出目录
+        :param cpu: 是否启用 cProfile
+        :param memory: 是否启用 tracemalloc
+        :param snapshot_interval: 操作进行期间按该间隔 (秒) 采样内存, None 表示只在开始与结束时采样
+        :param top: 报告中列出的函数与分配位置数
+        :param frames: tracemalloc 记录的调用栈深度, 越深越慢
+        """
+        self.output_dir = output_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.frames = frames
+        self._cpu_active = False
+        # 进行中的内存剖析数, 最后一个结束时才停止由本剖析器启动的 tracemalloc
+        self._memory_active = 0
+        self._started_tracing = False
+
+    @classmethod
+    def from_env(cls) -> "SessionProfiler | None":
+        """
+        :return: 按环境变量 PHONEDB_PROFILE 创建的剖析器, 未设置时为 None
+        """
+        value = os.environ.get(PROFILE_ENV, "")
+        if value.lower() in ("", "0", "false", "no"):
+            return None
+        if value.lower() in ("1", "true", "yes"):
+            return cls()
+        return cls(output_dir=value)
+
+    @contextlib.asynccontextmanager
+    async def profile(self, operation: str, database: AbstractDatabase | None = None) -> AsyncIterator[None]:
+        """
+        剖析代码块, 结束后写出报告
+
+        :param operation: 操作名称, 用于报告文件名
+        :param database: 指定时在报告中附上各类别的内存占用
+        """
+        profiler = None
+        if self.cpu and not self._cpu_active:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self._cpu_active = True
+            except ValueError:
+                # 其他剖析工具已启用
+                logger.warning(f"Another profiler is active, skip CPU profiling of {operation}.")
+                profiler = None
+
+        baseline = None
+        samples: list[tuple[float, int, int]] = []
+        sampler = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._started_tracing = True
+            self._memory_active += 1
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.take_snapshot()
+            if self.snapshot_interval is not None:
+                sampler = asyncio.create_task(self._sample(samples))
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._cpu_active = False
+            if sampler is not None:
+                sampler.cancel()
+            memory_report = None
+            if baseline is not None:
+                memory_report = self._memory_report(baseline, samples)
+                self._memory_active -= 1
+                if self._memory_active == 0 and self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            await self._write(operation, duration, profiler, memory_report, database)
+
+    async def _sample(self, samples: list[tuple[float, int, int]]):
+        start = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            current, peak = tracemalloc.get_traced_memory()
+            samples.append((time.perf_counter() - start, current, peak))
+
+    def _memory_report(self, baseline: tracemalloc.Snapshot, samples: list[tuple[float, int, int]]) -> str:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        lines = [f"current {_format_bytes(current)}, peak {_format_bytes(peak)}", f"top {self.top} allocations since start:"]
+        for stat in snapshot.compare_to(baseline, "lineno")[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {frame.filename}:{frame.lineno}: {_format_bytes(stat.size_diff):>12} "
+                f"({stat.count_diff:+d} blocks, total {_format_bytes(stat.size)})"
+            )
+        if samples:
+            lines.append("samples:")
+            lines.extend(f"  t={t:8.1f}s current {_format_bytes(c)}, peak {_format_bytes(p)}" for t, c, p in samples)
+        return "\n".join(lines)
+
+    async def _write(
+            self,
+            operation: str,
+            duration: float,
+            profiler: cProfile.Profile | None,
+            memory_report: str | None,
+            database: AbstractDatabase | None
+    ):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_operation = re.sub(r"\W+", "_", operation)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe_operation}"
+        sections = [f"== {operation} ==", f"duration {duration:.3f}s"]
+
+        if profiler is not None:
+            # 原始数据可用 snakeviz 等工具查看
+            profiler.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            sections += [f"-- CPU (top {self.top} by cumulative time) --", stream.getvalue().strip()]
+
+        if memory_report is not None:
+            sections += ["-- Memory (tracemalloc) --", memory_report]
+
+        if database is not None:
+            sections.append("-- Database memory by InstCat --")
+            for inst_cat, (count, size) in database_memory(database).items():
+                sections.append(f"  {inst_cat}: {count} instances, {_format_bytes(size)}")
+
+        filepath = os.path.join(self.output_dir, f"{name}.txt")
+        async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
+            await f.write("\n".join(sections) + "\n")
+        logger.info(f"Profile of {operation} ({duration:.3f}s) written to {filepath}")
@@ -0,0 +1,134 @@
+import dataclasses
+import heapq
+import re
+import time
+from typing import Iterable, TYPE_CHECKING
+
+from loguru import logger
+
+from .instance import InstCat, InstMeta
+from .runner import Lane
+
+if TYPE_CHECKING:
+    from .phonedb import PhoneDBHTTPSession
+
+DAY = 24 * 60 * 60
+
+
+@dataclasses.dataclass(slots=True)
+class RefreshPolicy:
+    """
+    刷新策略
+
+    :param recent_ttl: 近期发布实例的刷新间隔 (秒)
+    :param default_ttl: 其他实例的刷新间隔 (秒)
+    :param missing_ttl: 404 占位记录 (Meta.Image 为 None) 的复查间隔 (秒)
+    :param recent_years: 发布时间在最近多少年内视为近期发布
+    :param budget: 单次运行最多发出的请求数
+    """
+    recent_ttl: float = 1 * DAY
+    default_ttl: float = 30 * DAY
+    missing_ttl: float = 90 * DAY
+    recent_years: int = 1
+    budget: int = 500
+
+
+@dataclasses.dataclass(slots=True)
+class RefreshResult:
+    refreshed: list[InstMeta] = dataclasses.field(default_factory=list)
+    changed: list[InstMeta] = dataclasses.field(default_factory=list)
+    failed: list[InstMeta] = dataclasses.field(default_factory=list)
+
+
+class RefreshScheduler:
+    """
+    按记录的过期程度调度刷新: 过期越久越优先, 近期发布的实例刷新更频繁
+    """
+
+    _YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+
+    def __init__(self, session: "PhoneDBHTTPSession", policy: RefreshPolicy = None):
+        self.session = session
+        self.policy = policy or RefreshPolicy()
+
+    def _release_year(self, data: dict) -> int | None:
+        """
+        发售日期位于 Introduction/Released; 页面结构变化时在其他分类中查找同名字段,
+        都没有时才退回 Datasheet Attributes/Added (收录日期)
+        """
+        candidates = [data.get("Introduction", {}).get("Released")]
+        candidates += [
+            fields.get("Released") for section, fields in data.items()
+            if section not in ("Meta", "Introduction") and isinstance(fields, dict)
+        ]
+        candidates.append(data.get("Datasheet Attributes", {}).get("Added"))
+        for values in candidates:
+            for value in values or []:
+                if match := self._YEAR_PATTERN.search(value):
+                    return int(match.group())
+        return None
+
+    def ttl(self, data: dict, now: float) -> float:
+        """
+        :return: 该记录的刷新间隔 (秒)
+        """
+        if data.get("Meta", {}).get("Image") is None:
+            return self.policy.missing_ttl
+        year = self._release_year(data)
+        if year is not None and time.gmtime(now).tm_year - year < self.policy.recent_years:
+            return self.policy.recent_ttl
+        return self.policy.default_ttl
+
+    def plan(self, inst_cats: Iterable[InstCat] = InstCat, now: float | None = None) -> list[InstMeta]:
+        """
+        :return: 本次需要刷新的实例, 按过期程度降序, 数量不超过预算
+        """
+        now = time.time() if now is None else now
+        # 优先队列, 元素为 (-过期倍数, 类别, ID); 无抓取时间的旧记录视为最久未刷新
+        queue = []
+        all_data = self.session.database.get_all_data()
+        for inst_cat in inst_cats:
+            for inst_id, data in all_data.get(inst_cat, {}).items():
+                inst_meta = InstMeta(inst_cat, int(inst_id))
+                info = self.session.database.get_record_info(inst_meta)
+                age = now - (info.fetched_at if info else 0.0)
+                overdue = age / self.ttl(data, now)
+                if overdue >= 1:
+                    queue.append((-overdue, inst_cat, int(inst_id)))
+        heapq.heapify(queue)
+
+        plan = []
+        while queue and len(plan) < self.policy.budget:
+            _, inst_cat, inst_id = heapq.heappop(queue)
+            plan.append(InstMeta(inst_cat, inst_id))
+        return plan
+
+    async def run(self, inst_cats: Iterable[InstCat] = InstCat) -> RefreshResult:
+        """
+        执行一次刷新, 重新抓取 plan() 给出的实例并记录内容是否变化
+        """
+        plan = self.plan(inst_cats)
+        database = self.session.database
+        old_hashes = {}
+        for inst_meta in plan:
+            info = database.get_record_info(inst_meta)
+            old_hashes[(inst_meta.inst_cat, inst_meta.inst_id)] = info.content_hash if info else None
+
+        result = RefreshResult()
+        source = ((inst_meta, self.session.get_data(inst_meta, refresh=True)) for inst_meta in plan)
+        async for task_result in self.session.runner.stream(source, return_exceptions=True, lane=Lane.BACKFILL):
+            inst_meta = task_result.key
+            if not task_result.ok:
+                logger.error(f"Refresh {inst_meta} failed: {task_result.exception!r}")
+                result.failed.append(inst_meta)
+                continue
+            result.refreshed.append(inst_meta)
+            info = database.get_record_info(inst_meta)
+            if info is None or info.content_hash != old_hashes[(inst_meta.inst_cat, inst_meta.inst_id)]:
+                result.changed.append(inst_meta)
+
+        logger.info(
+            f"Refreshed {len(result.refreshed)}/{len(plan)}, "
+            f"changed {len(result.changed)}, failed {len(result.failed)}"
+        )
+        return result
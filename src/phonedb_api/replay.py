@@ -0,0 +1,228 @@
+import abc
+import asyncio
+import hashlib
+import html
+import os
+import random
+from typing import Any, Iterable
+
+import aiofiles
+import ujson
+
+from .database import AbstractDatabase
+from .instance import InstCat, InstMeta, PAGE_SIZE
+from .transport import AbstractTransport, TransportError, TransportResponse
+
+NOT_FOUND_PAGE = "<html><head><title>PhoneDB</title></head><body><h1>Error 404: not found</h1></body></html>"
+
+
+def _pairs(values: Any) -> list[tuple[str, str]]:
+    """
+    将参数规范化为排序后的 (键, 值) 列表, 列表值展开为多个同名键
+    """
+    if not values:
+        return []
+    items = values.items() if hasattr(values, "items") else values
+    pairs = []
+    for key, value in items:
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            pairs.append((str(key), str(item)))
+    return sorted(pairs)
+
+
+def request_key(method: str, params: Any = None, data: Any = None) -> str:
+    """
+    :return: 请求的规范化键, 与参数顺序无关
+    """
+    raw = ujson.dumps([method.upper(), _pairs(params), _pairs(data)], ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class PageStore(abc.ABC):
+    """
+    本地页面来源, 供 ReplayTransport 与 FakePhoneDBServer 使用
+    """
+
+    @abc.abstractmethod
+    async def lookup(self, method: str, params: dict[str, Any], data: dict[str, Any] | None) -> TransportResponse | None:
+        """
+        :return: 对应请求的响应, 不存在时为 None
+        """
+        pass
+
+
+class RecordingStore(PageStore):
+    """
+    录制的页面, 每个请求保存为 <directory>/<m>/<请求键>.json
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, params: dict[str, Any], key: str) -> str:
+        return os.path.join(self.directory, str(dict(params or {}).get("m", "_")), f"{key}.json")
+
+    async def lookup(self, method: str, params: dict[str, Any], data: dict[str, Any] | None) -> TransportResponse | None:
+        path = self._path(params, request_key(method, params, data))
+        if not os.path.exists(path):
+            return None
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            record = ujson.loads(await f.read())
+        return TransportResponse(record["status_code"], record["content"].encode(), record["url"])
+
+    async def save(self, method: str, params: dict[str, Any], data: dict[str, Any] | None, response: TransportResponse):
+        path = self._path(params, request_key(method, params, data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        async with aiofiles.open(path, "w", encoding="utf-8") as f:
+            await f.write(ujson.dumps({
+                "method": method.upper(),
+                "params": _pairs(params),
+                "data": _pairs(data),
+                "status_code": response.status_code,
+                "url": response.url,
+                "content": response.text,
+            }, ensure_ascii=False))
+
+
+class SyntheticStore(PageStore):
+    """
+    由数据库即时生成的页面: 详情页、列表页与搜索结果页, 适用于所有 InstCat;
+    不支持查询表单页 (需使用录制的页面)
+    """
+
+    def __init__(self, database: AbstractDatabase):
+        self.database = database
+
+    async def lookup(self, method: str, params: dict[str, Any], data: dict[str, Any] | None) -> TransportResponse | None:
+        params = dict(params or {})
+        data = dict(data or {})
+        inst_cat = InstCat(str(params.get("m", InstCat.DEVICE)))
+
+        if "id" in params:
+            inst_meta = InstMeta(inst_cat, int(params["id"]))
+            if inst_meta not in self.database or self.database.get_data(inst_meta)["Meta"]["Image"] is None:
+                return TransportResponse(404, NOT_FOUND_PAGE.encode())
+            return TransportResponse(200, render_detail_page(self.database.get_data(inst_meta)).encode())
+
+        if params.get("s") == "list":
+            if data.get("search_exp"):
+                inst_ids = sorted((inst_id for inst_id, _ in self.database.search_data(inst_cat, str(data["search_exp"]))), reverse=True)
+            else:
+                inst_ids = sorted(
+                    (int(inst_id) for inst_id, inst_data in self.database.get_all_data().get(inst_cat, {}).items()
+                     if inst_data["Meta"]["Image"] is not None),
+                    reverse=True
+                )
+            offset = int(params.get("filter", 0))
+            return TransportResponse(200, render_list_page(inst_cat, inst_ids[offset:offset + PAGE_SIZE], len(inst_ids)).encode())
+
+        return None
+
+
+def render_detail_page(data: dict) -> str:
+    """
+    生成与 InstanceParser 结构一致的详情页
+    """
+    head = "".join(f'<meta name="m{i}" content="">' for i in range(14))
+    head += f'<meta property="og:image" content="{html.escape(data["Meta"]["Image"] or "")}">'
+    rows = []
+    for section, fields in data.items():
+        if section == "Meta":
+            continue
+        rows.append(f"<tr><td colspan=\"2\"><h4>{html.escape(section)}</h4></td></tr>")
+        for field, values in fields.items():
+            first, *rest = values or [""]
+            rows.append(f"<tr><td><strong>{html.escape(field)}</strong></td><td>{html.escape(first)}</td></tr>")
+            rows.extend(f"<tr><td></td><td>{html.escape(value)}</td></tr>" for value in rest)
+    return f"<html><head>{head}</head><body><table>{''.join(rows)}</table></body></html>"
+
+
+def render_list_page(inst_cat: InstCat, inst_ids: Iterable[int], total: int) -> str:
+    """
+    生成与列表/搜索结果页结构一致的页面: body/div[4] 为结果数, body/div[5] 为结果项
+    """
+    entries = "".join(
+        f'<div><div><a href="index.php?m={inst_cat}&amp;id={inst_id}&amp;d=detailed_specs">{inst_id}</a></div></div>'
+        for inst_id in inst_ids
+    )
+    return (
+        "<html><head><title>PhoneDB</title></head><body>"
+        "<div></div><div></div><div></div>"
+        f"<div>{total} results</div>"
+        f"<div>{entries}<div style=\"clear: both\"></div></div>"
+        "</body></html>"
+    )
+
+
+class FaultInjector:
+    """
+    延迟与错误注入
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    async def delay(self):
+        if delay := self.latency + self._random.uniform(0, self.jitter):
+            await asyncio.sleep(delay)
+
+    def should_fail(self) -> bool:
+        return self._random.random() < self.error_rate
+
+
+class ReplayTransport(AbstractTransport):
+    """
+    从本地页面来源回放响应, 不访问网络
+    """
+
+    def __init__(self, store: PageStore, latency: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        super().__init__()
+        self.store = store
+        self.faults = FaultInjector(latency, error_rate=error_rate, seed=seed)
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: dict[str, Any] | None = None,
+            data: dict[str, Any] | None = None
+    ) -> TransportResponse:
+        await self.faults.delay()
+        if self.faults.should_fail():
+            self.stats.errors += 1
+            raise TransportError(f"Injected error for {method} {url}")
+        response = await self.store.lookup(method, params or {}, data)
+        if response is None:
+            response = TransportResponse(404, NOT_FOUND_PAGE.encode(), url)
+        self.stats.requests += 1
+        self.stats.bytes_received += len(response.content)
+        return response
+
+
+class RecordingTransport(AbstractTransport):
+    """
+    透传请求到内部传输层, 并将响应录制到 RecordingStore
+    """
+
+    def __init__(self, inner: AbstractTransport, store: RecordingStore):
+        super().__init__()
+        self.inner = inner
+        self.store = store
+        self.stats = inner.stats
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: dict[str, Any] | None = None,
+            data: dict[str, Any] | None = None
+    ) -> TransportResponse:
+        response = await self.inner.request(method, url, params=params, data=data)
+        await self.store.save(method, params or {}, data, response)
+        return response
+
+    async def close(self):
+        await self.inner.close()
@@ -0,0 +1,148 @@
+import asyncio
+import collections
+import random
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from .transport import TransportError, TransportResponse
+
+
+class HTTPStatusError(TransportError):
+    """
+    服务器返回了应当重试的状态码 (如 429, 5xx)
+    """
+
+    def __init__(self, response: TransportResponse):
+        super().__init__(f"HTTP {response.status_code} from {response.url}")
+        self.response = response
+
+
+class RetryBudget:
+    """
+    全局重试预算 (令牌桶): 每次成功存入 ratio 个令牌, 每次重试消耗 1 个令牌;
+    故障期间重试总量被限制为成功请求量的一定比例, 避免成倍放大对源站的压力
+    """
+
+    def __init__(self, ratio: float = 0.2, initial: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = initial
+
+    def deposit(self):
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    熔断器: 最近 window 次请求中错误比例超过 error_ratio 时断开 cooldown 秒,
+    期间所有经过它的请求都会等待, 相当于暂停执行器
+    """
+
+    def __init__(self, window: int = 50, error_ratio: float = 0.5, min_calls: int = 20, cooldown: float = 30.0):
+        self.error_ratio = error_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes: collections.deque[bool] = collections.deque(maxlen=window)
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def record(self, success: bool):
+        self._outcomes.append(success)
+        if len(self._outcomes) < self.min_calls:
+            return
+        errors = self._outcomes.count(False)
+        if errors / len(self._outcomes) >= self.error_ratio:
+            logger.warning(f"Circuit breaker open: {errors}/{len(self._outcomes)} failed, pause {self.cooldown}s.")
+            self._open_until = time.monotonic() + self.cooldown
+            # 冷却结束后重新统计
+            self._outcomes.clear()
+
+    async def wait(self):
+        while (delay := self._open_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+class RetryPolicy:
+    """
+    重试策略: 去相关抖动 (decorrelated jitter) 退避 + 全局重试预算 + 熔断器
+    """
+
+    def __init__(
+            self,
+            max_attempts: int = 5,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+            budget: RetryBudget | None = None,
+            breaker: CircuitBreaker | None = None,
+            retry_on: tuple[type[BaseException], ...] = (TransportError, asyncio.TimeoutError, ConnectionError, OSError),
+            retry_on_status: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+    ):
+        """
+        :param max_attempts: 单次调用的最大尝试次数
+        :param base_delay: 最小退避时间 (秒)
+        :param max_delay: 最大退避时间 (秒)
+        :param budget: 全局重试预算, 默认新建一个
+        :param breaker: 熔断器, 默认新建一个
+        :param retry_on: 需要重试的异常类型
+        :param retry_on_status: 需要重试的 HTTP 状态码
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_on = retry_on
+        self.retry_on_status = retry_on_status
+
+    def next_delay(self, previous: float) -> float:
+        """
+        去相关抖动: sleep = min(max_delay, uniform(base_delay, previous * 3))
+        """
+        return min(self.max_delay, random.uniform(self.base_delay, max(previous, self.base_delay) * 3))
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        delay = self.base_delay
+        attempt = 1
+        while True:
+            await self.breaker.wait()
+            try:
+                result = await func(*args, **kwargs)
+                if isinstance(result, TransportResponse) and result.status_code in self.retry_on_status:
+                    raise HTTPStatusError(result)
+            except self.retry_on as e:
+                self.breaker.record(False)
+                if attempt >= self.max_attempts:
+                    raise
+                if not self.budget.withdraw():
+                    logger.error(f"Retry budget exhausted, give up: {e!r}")
+                    raise
+                delay = self.next_delay(delay)
+                logger.warning(f"Request failed (attempt {attempt}/{self.max_attempts}), retry in {delay:.1f}s: {e!r}")
+                attempt += 1
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record(True)
+                self.budget.deposit()
+                return result
+
+    def __call__(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """
+        作为协程函数的装饰器使用
+        """
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.call(func, *args, **kwargs)
+
+        return wrapper
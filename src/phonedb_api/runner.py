@@ -1,54 +1,416 @@
 import abc
 import asyncio
+import collections
+import dataclasses
+import enum
+import inspect
 import os
-from typing import Callable, AsyncGenerator, Coroutine, Awaitable, Any
+import time
+from typing import Callable, AsyncGenerator, AsyncIterable, Coroutine, Awaitable, Any, Iterable
+
+
+@dataclasses.dataclass(slots=True)
+class TaskResult:
+    """
+    任务结果信封, 携带成功值或异常
+
+    key 为注册时传入的键, 未指定时为提交序号
+    """
+    key: Any
+    value: Any = None
+    exception: BaseException | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exception is None
+
+    def unwrap(self) -> Any:
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+# 数据源中的每一项可以是协程, 也可以是 (key, 协程) 二元组
+RunnerItem = Awaitable[Any] | tuple[Any, Awaitable[Any]]
 
 
 class AbstractAsyncRunner(abc.ABC):
-    @abc.abstractmethod
-    def register(self, coro: Awaitable[Any]):
-        pass
+    def __init__(self, timeout: float | None = None):
+        """
+        :param timeout: 单个任务的超时时间 (秒), 超时后任务被取消并以 asyncio.TimeoutError 失败
+        """
+        self._coroutines: list[tuple[Any, Awaitable[Any]]] = []
+        self._timeout = timeout
+
+    def register(self, coro: Awaitable[Any], key: Any = None):
+        self._coroutines.append((len(self._coroutines) if key is None else key, coro))
+
+    def register_multi(self, coroutines: list[Awaitable[Any]]):
+        for coro in coroutines:
+            self.register(coro)
+
+    async def run(self, return_exceptions: bool = False, lane: "Lane | None" = None) -> AsyncGenerator[Any, None]:
+        """
+        执行所有已注册的协程; 无论正常结束、出错还是消费者提前停止, 注册队列都会被清空
+        """
+        coroutines, self._coroutines = self._coroutines, []
+        try:
+            async for result in self.stream(coroutines, return_exceptions, lane):
+                yield result
+        finally:
+            _close_unstarted(coro for _, coro in coroutines)
 
     @abc.abstractmethod
-    async def run(self) -> AsyncGenerator[Any, None]:
+    async def stream(
+            self,
+            source: Iterable[RunnerItem] | AsyncIterable[RunnerItem],
+            return_exceptions: bool = False,
+            lane: "Lane | None" = None
+    ) -> AsyncGenerator[Any, None]:
+        """
+        从 source 中惰性地拉取协程并执行, 不预先注册
+
+        :param source: 协程 (或 (key, 协程) 二元组) 的可迭代对象或异步可迭代对象
+        :param return_exceptions: 为 True 时产出 TaskResult, 单个任务失败不会中断整个流
+        :param lane: 任务所属的调度通道, 仅对 AsyncFairRunner 生效
+        """
         pass
 
+    async def submit(self, coro: Awaitable[Any], lane: "Lane | None" = None) -> Any:
+        """
+        执行单个协程并返回其结果
+        """
+        return await self._guard(coro, lane)
 
-class AsyncSerialRunner(AbstractAsyncRunner):
-    def __init__(self):
-        self._coroutines: list[Awaitable[Any]] = []
+    @staticmethod
+    def _unpack(item: RunnerItem, index: int) -> tuple[Any, Awaitable[Any]]:
+        if isinstance(item, tuple):
+            return item
+        return index, item
 
-    def register(self, coro: Awaitable[Any]):
-        self._coroutines.append(coro)
+    async def _guard(self, coro: Awaitable[Any], lane: "Lane | None" = None) -> Any:
+        if self._timeout is None:
+            return await coro
+        return await asyncio.wait_for(coro, self._timeout)
 
-    def register_multi(self, coroutines: list[Awaitable[Any]]):
-        self._coroutines.extend(coroutines)
+    @staticmethod
+    def _result(key: Any, task: asyncio.Future, return_exceptions: bool) -> Any:
+        if not return_exceptions:
+            return task.result()
+        if task.cancelled():
+            return TaskResult(key, exception=asyncio.CancelledError())
+        if (exception := task.exception()) is not None:
+            return TaskResult(key, exception=exception)
+        return TaskResult(key, task.result())
 
-    async def run(self) -> AsyncGenerator[Any, None]:
-        for task in self._coroutines:
-            yield await task
-        self._coroutines.clear()
+    @staticmethod
+    async def _cancel_all(tasks: dict[asyncio.Future, tuple[Any, Awaitable[Any]]]):
+        """
+        取消所有未完成的任务, 并关闭因此从未启动的协程
+        """
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            # 同时取回已完成任务的异常, 避免 "exception was never retrieved"
+            await asyncio.gather(*tasks, return_exceptions=True)
+        _close_unstarted(coro for _, coro in tasks.values())
+
+
+class AsyncSerialRunner(AbstractAsyncRunner):
+    async def stream(
+            self,
+            source: Iterable[RunnerItem] | AsyncIterable[RunnerItem],
+            return_exceptions: bool = False,
+            lane: "Lane | None" = None
+    ) -> AsyncGenerator[Any, None]:
+        index = 0
+        iterator = aiter(source) if isinstance(source, AsyncIterable) else _aiter_sync(source)
+        async for item in iterator:
+            key, coro = self._unpack(item, index)
+            index += 1
+            task = asyncio.ensure_future(self._guard(coro, lane))
+            try:
+                await asyncio.wait((task,))
+            finally:
+                await self._cancel_all({task: (key, coro)})
+            yield self._result(key, task, return_exceptions)
 
 
 class AsyncParallelRunner(AbstractAsyncRunner):
-    def __init__(self, max_workers: int = os.process_cpu_count()):
-        self._coroutines: list[Awaitable[Any]] = []
+    def __init__(self, max_workers: int = os.process_cpu_count(), timeout: float | None = None):
+        super().__init__(timeout)
         self._max_workers = max_workers or 32
 
-    def register(self, coro: Awaitable[Any]):
-        self._coroutines.append(coro)
+    async def stream(
+            self,
+            source: Iterable[RunnerItem] | AsyncIterable[RunnerItem],
+            return_exceptions: bool = False,
+            lane: "Lane | None" = None
+    ) -> AsyncGenerator[Any, None]:
+        """
+        同时最多保持 max_workers 个任务在执行; 消费者未取走结果前不会拉取新的协程 (背压)
 
-    def register_multi(self, coroutines: list[Awaitable[Any]]):
-        self._coroutines.extend(coroutines)
+        :yield: 按完成顺序产出的结果
+        """
+        pending: dict[asyncio.Future, tuple[Any, Awaitable[Any]]] = {}
+        is_async = isinstance(source, AsyncIterable)
+        iterator = aiter(source) if is_async else iter(source)
+        # 异步数据源的拉取本身也作为一个任务参与等待, 避免慢速数据源阻塞已完成结果的产出
+        pull: asyncio.Future | None = None
+        exhausted = False
+        index = 0
+
+        try:
+            while True:
+                if is_async:
+                    if not exhausted and pull is None and len(pending) < self._max_workers:
+                        pull = asyncio.ensure_future(anext(iterator))
+                else:
+                    while not exhausted and len(pending) < self._max_workers:
+                        try:
+                            key, coro = self._unpack(next(iterator), index)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        pending[asyncio.ensure_future(self._guard(coro, lane))] = key, coro
+                        index += 1
+
+                waiting = pending.keys() | {pull} if pull is not None else pending.keys()
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if pull is not None and pull in done:
+                    try:
+                        key, coro = self._unpack(pull.result(), index)
+                        pending[asyncio.ensure_future(self._guard(coro, lane))] = key, coro
+                        index += 1
+                    except StopAsyncIteration:
+                        exhausted = True
+                    pull = None
+
+                for task in done:
+                    if task in pending:
+                        key, _ = pending.pop(task)
+                        yield self._result(key, task, return_exceptions)
+        finally:
+            # 出错或消费者停止迭代时, 取消所有未完成的任务
+            if pull is not None:
+                await self._cancel_all({pull: (None, None)})
+            await self._cancel_all(pending)
+
+
+class AsyncOrderedParallelRunner(AsyncParallelRunner):
+    """
+    并行执行, 但按提交顺序产出结果
 
-    async def run(self) -> AsyncGenerator[Any, None]:
-        # Semaphore
+    已提交但尚未产出的任务保存在大小为 window_size 的重排窗口中;
+    当队首任务较慢导致窗口填满时, 暂停提交新任务, 直到队首完成
+    """
+
+    def __init__(
+            self,
+            max_workers: int = os.process_cpu_count(),
+            window_size: int | None = None,
+            timeout: float | None = None
+    ):
+        super().__init__(max_workers, timeout)
+        self._window_size = max(window_size or self._max_workers * 2, 1)
+
+    async def stream(
+            self,
+            source: Iterable[RunnerItem] | AsyncIterable[RunnerItem],
+            return_exceptions: bool = False,
+            lane: "Lane | None" = None
+    ) -> AsyncGenerator[Any, None]:
         semaphore = asyncio.Semaphore(self._max_workers)
 
         async def sem_coro(coro: Awaitable[Any]):
             async with semaphore:
-                return await coro
+                return await self._guard(coro, lane)
+
+        window: collections.deque[tuple[Any, Awaitable[Any], asyncio.Future]] = collections.deque()
+        is_async = isinstance(source, AsyncIterable)
+        iterator = aiter(source) if is_async else iter(source)
+        # 与 AsyncParallelRunner 相同, 异步数据源的拉取作为任务与队首一同等待, 慢速数据源不会推迟已完成的队首
+        pull: asyncio.Future | None = None
+        exhausted = False
+        index = 0
+
+        try:
+            while True:
+                if is_async:
+                    if not exhausted and pull is None and len(window) < self._window_size:
+                        pull = asyncio.ensure_future(anext(iterator))
+                else:
+                    while not exhausted and len(window) < self._window_size:
+                        try:
+                            key, coro = self._unpack(next(iterator), index)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        window.append((key, coro, asyncio.ensure_future(sem_coro(coro))))
+                        index += 1
+
+                waiting = {window[0][2]} if window else set()
+                if pull is not None:
+                    waiting.add(pull)
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if pull is not None and pull in done:
+                    try:
+                        key, coro = self._unpack(pull.result(), index)
+                        window.append((key, coro, asyncio.ensure_future(sem_coro(coro))))
+                        index += 1
+                    except StopAsyncIteration:
+                        exhausted = True
+                    pull = None
+
+                # 按提交顺序产出所有已完成的队首
+                while window and window[0][2].done():
+                    key, _, task = window.popleft()
+                    yield self._result(key, task, return_exceptions)
+        finally:
+            if pull is not None:
+                await self._cancel_all({pull: (None, None)})
+            await self._cancel_all({task: (key, coro) for key, coro, task in window})
+
+
+class Lane(enum.StrEnum):
+    """
+    AsyncFairRunner 的调度通道
+    """
+    INTERACTIVE = "interactive"
+    SYNC = "sync"
+    BACKFILL = "backfill"
+
+
+@dataclasses.dataclass(slots=True)
+class LaneStats:
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        started = self.running + self.completed
+        return self.total_wait / started if started else 0.0
+
+
+class AsyncFairRunner(AsyncParallelRunner):
+    """
+    多通道公平调度执行器
+
+    所有通道共享 max_workers 个全局并发槽位; 有空闲槽位时, 按加权公平排队
+    (stride scheduling) 在有任务等待的通道间分配, 通道内先进先出。
+    交互式请求因此不会被大批量回填任务饿死
+    """
+
+    DEFAULT_WEIGHTS = {
+        Lane.INTERACTIVE: 16,
+        Lane.SYNC: 4,
+        Lane.BACKFILL: 1,
+    }
+
+    def __init__(
+            self,
+            max_workers: int = os.process_cpu_count(),
+            weights: dict[Lane, float] | None = None,
+            default_lane: Lane = Lane.BACKFILL,
+            timeout: float | None = None
+    ):
+        """
+        :param weights: 各通道的权重, 权重越大分到的槽位越多
+        :param default_lane: stream/run 未指定通道时使用的通道
+        """
+        super().__init__(max_workers, timeout)
+        self._weights = self.DEFAULT_WEIGHTS | (weights or {})
+        self._default_lane = default_lane
+        self._running = 0
+        self._waiters: dict[Lane, collections.deque[tuple[asyncio.Future, float]]] = {
+            lane: collections.deque() for lane in Lane
+        }
+        # 各通道的虚拟时间, 每分配一个槽位前进 1 / 权重
+        self._passes: dict[Lane, float] = {lane: 0.0 for lane in Lane}
+        self._stats: dict[Lane, LaneStats] = {lane: LaneStats() for lane in Lane}
+
+    def stats(self) -> dict[Lane, LaneStats]:
+        """
+        :return: 各通道的排队深度、运行数与等待时间
+        """
+        return {lane: dataclasses.replace(stats) for lane, stats in self._stats.items()}
+
+    async def _guard(self, coro: Awaitable[Any], lane: Lane | None = None) -> Any:
+        lane = lane or self._default_lane
+        await self._acquire(lane)
+        try:
+            return await super()._guard(coro)
+        finally:
+            self._release(lane)
+
+    async def _acquire(self, lane: Lane):
+        stats = self._stats[lane]
+        if self._running < self._max_workers and not any(self._waiters.values()):
+            self._running += 1
+            stats.running += 1
+            return
+
+        if not self._waiters[lane]:
+            # 通道由空闲转为活跃时, 不允许其积攒空闲期间的份额
+            active = [self._passes[other] for other, waiters in self._waiters.items() if waiters]
+            if active:
+                self._passes[lane] = max(self._passes[lane], min(active))
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append((future, time.monotonic()))
+        stats.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位但在恢复前被取消, 归还槽位
+                self._release(lane)
+            raise
+
+    def _release(self, lane: Lane):
+        self._running -= 1
+        self._stats[lane].running -= 1
+        self._stats[lane].completed += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self._max_workers:
+            candidates = [lane for lane, waiters in self._waiters.items() if waiters]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda item: self._passes[item])
+            future, enqueued_at = self._waiters[lane].popleft()
+            stats = self._stats[lane]
+            stats.queued -= 1
+            if future.cancelled():
+                continue
+            self._passes[lane] += 1 / self._weights[lane]
+            wait = time.monotonic() - enqueued_at
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            stats.running += 1
+            self._running += 1
+            future.set_result(None)
+
+
+def _close_unstarted(coroutines: Iterable[Awaitable[Any] | None]):
+    """
+    关闭从未启动过的协程, 避免 "coroutine was never awaited" 警告
+    """
+    for coro in coroutines:
+        if inspect.iscoroutine(coro) and inspect.getcoroutinestate(coro) == inspect.CORO_CREATED:
+            coro.close()
+
 
-        for task in asyncio.as_completed((sem_coro(coro) for coro in self._coroutines)):
-            yield await task
-        self._coroutines.clear()
+async def _aiter_sync(iterable: Iterable[Any]) -> AsyncGenerator[Any, None]:
+    for item in iterable:
+        yield item
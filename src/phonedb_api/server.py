@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import collections
+import multiprocessing
+import os
+import signal
+from typing import Any
+
+import ujson
+from aiohttp import web
+from loguru import logger
+
+from .database import AbstractDatabase, JsonDatabase, PickleDatabase, Query, QueryStrategy
+from .instance import InstCat, InstMeta
+from .language import LangClass, LangClassEnUS, LangClassZhCN
+
+_LANGS: dict[str, LangClass] = {lang.code.lower(): lang for lang in (LangClassEnUS(), LangClassZhCN())}
+
+
+class QueryError(ValueError):
+    """
+    请求体无效, 以 400 响应
+    """
+
+
+def parse_query_params(raw: Any) -> dict[str, dict[str, list[Query]]]:
+    """
+    将 JSON 查询条件转换为 query_data 的参数
+
+    格式: {"分类": {"字段": ["文本", {"query": "8", "strategy": "at_least"}, ...]}},
+    字符串等价于 {"query": 字符串, "strategy": "contains"}
+    """
+    if not isinstance(raw, dict):
+        raise QueryError("params must be an object")
+    params = {}
+    for section, fields in raw.items():
+        if not isinstance(fields, dict):
+            raise QueryError(f"params[{section!r}] must be an object")
+        params[section] = {}
+        for field, queries in fields.items():
+            if not isinstance(queries, list):
+                queries = [queries]
+            parsed = []
+            for query in queries:
+                if isinstance(query, str):
+                    parsed.append(Query(query))
+                elif isinstance(query, dict) and isinstance(query.get("query"), str):
+                    try:
+                        strategy = QueryStrategy(query.get("strategy", QueryStrategy.CONTAINS))
+                    except ValueError:
+                        raise QueryError(f"unknown strategy {query.get('strategy')!r}") from None
+                    _check_operand(query["query"], strategy)
+                    parsed.append(Query(query["query"], strategy))
+                else:
+                    raise QueryError(f"invalid query for {section!r} / {field!r}: {query!r}")
+            params[section][field] = parsed
+    return params
+
+
+def _check_operand(query: str, strategy: QueryStrategy):
+    """
+    检查比较类策略的查询值格式, 避免匹配时才在 int() 中失败
+    """
+    if strategy in (QueryStrategy.AT_LEAST, QueryStrategy.WITHOUT_UNIT_AT_LEAST):
+        if not query.strip().isdigit():
+            raise QueryError(f"{strategy} expects an integer, got {query!r}")
+    elif strategy == QueryStrategy.DISPLAY_RESOLUTION_AT_LEAST:
+        width, _, height = query.partition("x")
+        if not (width.strip().isdigit() and height.strip().isdigit()):
+            raise QueryError(f"{strategy} expects WIDTHxHEIGHT, got {query!r}")
+
+
+class QueryServer:
+    """
+    数据库的只读 HTTP 查询服务
+
+    接口:
+        POST /query   {"inst_cat": "device", "params": {...}, "lang": "zh_CN", "offset": 0, "limit": 100}
+        POST /search  {"inst_cat": "device", "query": "snapdragon", "lang": "zh_CN", "offset": 0, "limit": 100}
+        GET  /instance/{inst_cat}/{inst_id}
+        GET  /stats
+
+    响应按 (接口, 规范化的请求体, 数据库版本) 缓存为序列化后的字节; 相同的并发请求只计算一次。
+    查询在线程池中执行, 期间事件循环仍可处理其他连接; 服务期间数据库不应被修改
+
+    Example:
+        database = PickleDatabase("phonedb.pkl")
+        await database.load()
+        async with QueryServer(database, port=8080) as server:
+            await asyncio.Event().wait()
+    """
+
+    def __init__(
+            self,
+            database: AbstractDatabase,
+            host: str = "127.0.0.1",
+            port: int = 8080,
+            cache_size: int = 1024,
+            max_limit: int = 10000,
+            keepalive_timeout: float = 75.0,
+            reuse_port: bool = False
+    ):
+        """
+        :param cache_size: 缓存的响应数
+        :param max_limit: 单次响应的最大结果数
+        :param keepalive_timeout: 空闲长连接的保持时间 (秒)
+        :param reuse_port: 允许多个进程监听同一端口 (SO_REUSEPORT), 由内核分配连接
+        """
+        self.database = database
+        self.host = host
+        self.port = port
+        self.cache_size = cache_size
+        self.max_limit = max_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.reuse_port = reuse_port
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._cache: collections.OrderedDict[tuple, bytes] = collections.OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/query", self._handle_query)
+        app.router.add_post("/search", self._handle_search)
+        app.router.add_get("/instance/{inst_cat}/{inst_id}", self._handle_instance)
+        app.router.add_get("/stats", self._handle_stats)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None, keepalive_timeout=self.keepalive_timeout)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, reuse_port=self.reuse_port or None)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Query server listening on {self.base_url} (pid {os.getpid()})")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @staticmethod
+    async def _read_body(request: web.Request) -> dict:
+        try:
+            body = ujson.loads(await request.read() or b"{}")
+        except ValueError:
+            raise QueryError("body must be valid JSON") from None
+        if not isinstance(body, dict):
+            raise QueryError("body must be an object")
+        return body
+
+    def _common(self, body: dict) -> tuple[InstCat, LangClass | None, int, int]:
+        try:
+            inst_cat = InstCat(body.get("inst_cat", InstCat.DEVICE))
+        except ValueError:
+            raise QueryError(f"unknown inst_cat {body.get('inst_cat')!r}") from None
+        lang = None
+        if (code := body.get("lang")) is not None and (lang := _LANGS.get(str(code).lower())) is None:
+            raise QueryError(f"unknown lang {code!r}")
+        offset = body.get("offset", 0)
+        limit = body.get("limit", self.max_limit)
+        if not isinstance(offset, int) or not isinstance(limit, int) or offset < 0 or limit < 0:
+            raise QueryError("offset and limit must be non-negative integers")
+        return inst_cat, lang, offset, min(limit, self.max_limit)
+
+    async def _respond(self, endpoint: str, body: dict, compute) -> web.Response:
+        """
+        :param compute: 在线程池中执行, 返回序列化后的响应体
+        """
+        key = (endpoint, ujson.dumps(body, sort_keys=True), self.database.version)
+        if (cached := self._cache.get(key)) is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._json_response(cached)
+
+        if (future := self._inflight.get(key)) is None:
+            self.misses += 1
+            future = asyncio.ensure_future(asyncio.get_running_loop().run_in_executor(None, compute))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        try:
+            # shield: 客户端断开不影响其他等待同一结果的请求
+            payload = await asyncio.shield(future)
+        except ValueError as e:
+            # 查询值与字段值无法比较, 例如 at_least 用于带单位的字段
+            return self._error(f"query cannot be evaluated: {e}")
+        self._cache[key] = payload
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return self._json_response(payload)
+
+    @staticmethod
+    def _json_response(payload: bytes, status: int = 200) -> web.Response:
+        return web.Response(status=status, body=payload, content_type="application/json")
+
+    @classmethod
+    def _error(cls, message: str, status: int = 400) -> web.Response:
+        return cls._json_response(ujson.dumps({"error": message}).encode(), status)
+
+    @staticmethod
+    def _serialize(inst_cat: InstCat, items: list[tuple[int, dict]], offset: int, limit: int) -> bytes:
+        page = items[offset:offset + limit]
+        return ujson.dumps({
+            "count": len(items),
+            "results": [{"inst_cat": inst_cat, "inst_id": inst_id, "data": data} for inst_id, data in page],
+        }, ensure_ascii=False).encode()
+
+    async def _handle_query(self, request: web.Request) -> web.Response:
+        try:
+            body = await self._read_body(request)
+            inst_cat, lang, offset, limit = self._common(body)
+            params = parse_query_params(body.get("params", {}))
+        except QueryError as e:
+            return self._error(str(e))
+
+        def compute() -> bytes:
+            instances = self.database.query_data(inst_cat, params, lang=lang)
+            return self._serialize(inst_cat, [(instance.meta.inst_id, instance.data) for instance in instances], offset, limit)
+
+        return await self._respond("query", body, compute)
+
+    async def _handle_search(self, request: web.Request) -> web.Response:
+        try:
+            body = await self._read_body(request)
+            inst_cat, lang, offset, limit = self._common(body)
+            if not isinstance(query := body.get("query"), str):
+                raise QueryError("query must be a string")
+        except QueryError as e:
+            return self._error(str(e))
+
+        def compute() -> bytes:
+            return self._serialize(inst_cat, self.database.search_data(inst_cat, query, lang=lang), offset, limit)
+
+        return await self._respond("search", body, compute)
+
+    async def _handle_instance(self, request: web.Request) -> web.Response:
+        try:
+            inst_meta = InstMeta(InstCat(request.match_info["inst_cat"]), int(request.match_info["inst_id"]))
+        except ValueError:
+            return self._error("invalid inst_cat or inst_id")
+        if inst_meta not in self.database:
+            return self._error("not found", 404)
+
+        def compute() -> bytes:
+            data = self.database.get_data(inst_meta)
+            return ujson.dumps({"inst_cat": inst_meta.inst_cat, "inst_id": inst_meta.inst_id, "data": data}, ensure_ascii=False).encode()
+
+        return await self._respond("instance", {"key": inst_meta.key}, compute)
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return self._json_response(ujson.dumps({
+            "pid": os.getpid(),
+            "version": self.database.version,
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }).encode())
+
+
+def serve(database: AbstractDatabase, workers: int = 1, **server_kwargs):
+    """
+    阻塞地提供服务, 直到收到 SIGINT/SIGTERM
+
+    workers > 1 时, 在加载好的数据库之上 fork 出多个进程 (写时复制共享同一份快照),
+    各自监听同一端口 (SO_REUSEPORT), 仅支持 Linux 等提供 fork 与 SO_REUSEPORT 的平台
+
+    :param database: 已加载的数据库
+    :param workers: 进程数
+    :param server_kwargs: 传递给 QueryServer
+    """
+    if workers <= 1:
+        asyncio.run(_serve_forever(QueryServer(database, **server_kwargs)))
+        return
+
+    server_kwargs["reuse_port"] = True
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_worker, args=(database, server_kwargs), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    # 父进程收到 SIGTERM 时同样结束所有工作进程
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def _worker(database: AbstractDatabase, server_kwargs: dict[str, Any]):
+    asyncio.run(_serve_forever(QueryServer(database, **server_kwargs)))
+
+
+async def _serve_forever(server: QueryServer):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PhoneDB 数据库查询服务")
+    parser.add_argument("database", help="数据库文件, .json 为 JsonDatabase, 其余为 PickleDatabase")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    database = JsonDatabase(args.database) if args.database.endswith(".json") else PickleDatabase(args.database)
+    asyncio.run(database.load())
+    serve(database, args.workers, host=args.host, port=args.port, cache_size=args.cache_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import abc
+import asyncio
+import dataclasses
+import time
+import urllib.parse
+from typing import Any
+
+import curl_cffi
+
+
+class TransportError(ConnectionError):
+    """
+    传输层错误, 各传输实现将底层库的异常统一转换为此异常
+    """
+
+
+@dataclasses.dataclass(slots=True)
+class TransportResponse:
+    status_code: int
+    content: bytes
+    url: str = ""
+    encoding: str = "utf-8"
+    elapsed: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+@dataclasses.dataclass(slots=True)
+class TransportStats:
+    requests: int = 0
+    errors: int = 0
+    bytes_received: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.connections_opened + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+
+def encode_form(data: dict[str, Any]) -> bytes:
+    """
+    编码表单数据, 列表值展开为同名的多个字段 (复选框 name[] 需要)
+    """
+    return urllib.parse.urlencode(data, doseq=True).encode()
+
+
+class AbstractTransport(abc.ABC):
+    """
+    HTTP 传输层, PhoneDBHTTPSession 的所有请求都经由它发出
+    """
+
+    def __init__(self):
+        self.stats = TransportStats()
+
+    @abc.abstractmethod
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: dict[str, Any] | None = None,
+            data: dict[str, Any] | None = None
+    ) -> TransportResponse:
+        pass
+
+    async def get(self, url: str, params: dict[str, Any] | None = None) -> TransportResponse:
+        return await self.request("GET", url, params=params)
+
+    async def post(self, url: str, params: dict[str, Any] | None = None, data: dict[str, Any] | None = None) -> TransportResponse:
+        return await self.request("POST", url, params=params, data=data)
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class CurlCffiTransport(AbstractTransport):
+    """
+    基于 curl_cffi 的传输层, 全部请求共享同一个连接池
+    """
+
+    def __init__(
+            self,
+            max_connections: int = 64,
+            max_connections_per_host: int = 16,
+            keep_alive: bool = True,
+            http2: bool = True,
+            **kwargs
+    ):
+        """
+        :param max_connections: 连接池的总连接数上限
+        :param max_connections_per_host: 每个主机的并发连接数上限
+        :param keep_alive: 是否复用连接
+        :param http2: 服务器支持时是否使用 HTTP/2
+        :param kwargs: 传递给 curl_cffi.AsyncSession 的其他参数, 例如 verify, impersonate
+        """
+        super().__init__()
+        kwargs.setdefault(
+            "http_version",
+            curl_cffi.CurlHttpVersion.V2TLS if http2 else curl_cffi.CurlHttpVersion.V1_1
+        )
+        self._session = curl_cffi.AsyncSession(max_clients=max_connections, **kwargs)
+        self._keep_alive = keep_alive
+        self._max_connections_per_host = max_connections_per_host
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+        # 已见过的 (远端地址, 本地端口), 用于估计连接复用情况
+        self._connections: set[tuple[str, int]] = set()
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            params: dict[str, Any] | None = None,
+            data: dict[str, Any] | None = None
+    ) -> TransportResponse:
+        host = urllib.parse.urlsplit(url).netloc
+        semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self._max_connections_per_host))
+
+        headers = {}
+        if not self._keep_alive:
+            headers["Connection"] = "close"
+        body = None
+        if data is not None:
+            body = encode_form(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._session.request(method, url, params=params, data=body, headers=headers)
+            except curl_cffi.CurlError as e:
+                self.stats.errors += 1
+                raise TransportError(str(e)) from e
+            elapsed = time.perf_counter() - start
+
+        self.stats.requests += 1
+        self.stats.bytes_received += len(response.content)
+        self._track_connection(response)
+        return TransportResponse(
+            status_code=response.status_code,
+            content=response.content,
+            url=str(response.url),
+            encoding=response.encoding or "utf-8",
+            elapsed=elapsed
+        )
+
+    def _track_connection(self, response):
+        primary_ip, local_port = getattr(response, "primary_ip", None), getattr(response, "local_port", None)
+        if not primary_ip or not local_port:
+            return
+        if (primary_ip, local_port) in self._connections:
+            self.stats.connections_reused += 1
+        else:
+            self._connections.add((primary_ip, local_port))
+            self.stats.connections_opened += 1
+
+    async def close(self):
+        await self._session.close()